@@ -1,53 +1,32 @@
-import json
 import os
-import sys
 import threading
-import ctypes
 import tkinter as tk
-from tkinter import messagebox, simpledialog, scrolledtext, ttk
-from zk_sync import fetch_logs_and_sync
-import time
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox, simpledialog, scrolledtext, ttk
+from zk_sync import fetch_logs_and_sync, device_key, DEFAULT_WORKERS
+from health import get_health, probe
+from device_manager import DeviceRegistry, site_of, DEFAULT_SITE
+from http_client import HttpClient
+from backfill import run_backfill, parse_date
+from live import run_live
+from scheduler import DeviceScheduler
+from log_sink import TkLogSink, DEFAULT_MAX_LINES, DEFAULT_FLUSH_MS
+from zk_config import CONFIG_FILE, FIXED_API_URL, default_config, read_config, write_config
+from datetime import date, timedelta
 
-# ===== PATHS SAFE =====
-if getattr(sys, "frozen", False):
-    # BASE_DIR = os.path.dirname(os.path.realpath(sys.executable))
-    BASE_DIR = os.path.join(os.path.expanduser("~"), ".zkteco_sync")
-else:
-    # BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-os.makedirs(BASE_DIR, exist_ok=True)
-# CONFIG_FILE = os.path.join(BASE_DIR, ".zkdata")
-CONFIG_FILE = os.path.join(BASE_DIR, ".zkdata")
-
-
-
-FIXED_API_URL = "https://payrool.nitbd.com/api/iclock/cdata"
 
 # ===== CONFIG HANDLING =====
 def load_config():
     if not os.path.exists(CONFIG_FILE):
-        cfg = {"devices": [], "auto_sync_interval": 0}
+        cfg = default_config()
         save_config(cfg)
         return cfg
 
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def hide_file(path):
-    try:
-        FILE_ATTRIBUTE_HIDDEN = 0x02
-        ctypes.windll.kernel32.SetFileAttributesW(path, FILE_ATTRIBUTE_HIDDEN)
-    except:
-        pass
+    return read_config()
 
 def save_config(cfg):
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, indent=4)
-
-        # hide file after save (Windows)
-        if os.name == "nt":
-            hide_file(CONFIG_FILE)
+        write_config(cfg)
 
     except PermissionError:
         messagebox.showerror(
@@ -65,8 +44,11 @@ class ZKApp:
         self.root.resizable(False, False)
 
         self.config = load_config()
+        self.registry = DeviceRegistry(self.config, save_config)  # 🗂 SN/IP index, শুধু বদলানো অংশ লেখা হয়
         self.sync_thread_running = False
-        self.auto_sync_job = None
+        self.scheduler = None
+        self.live_stop = None
+        self.http = HttpClient.from_options(self.config)  # 🔗 সব sync run এই session reuse করবে
 
         # ===== DEVICE LIST FRAME =====
         device_frame = tk.Frame(root)
@@ -74,10 +56,16 @@ class ZKApp:
 
         tk.Label(device_frame, text="Device List", font=("Arial", 11, "bold")).pack(anchor="w")
 
-        self.tree = ttk.Treeview(device_frame, columns=("IP", "Port", "SN"), show="headings", height=8)
+        # 🌳 site অনুযায়ী group; row-এর iid = device key, তাই শুধু বদলানো row-টাই update হয়
+        self.tree = ttk.Treeview(device_frame, columns=("IP", "Port", "SN", "Status"), show="tree headings", height=8)
+        self.tree.heading("#0", text="Site")
+        self.tree.column("#0", width=140)
         self.tree.heading("IP", text="IP Address")
         self.tree.heading("Port", text="Port")
+        self.tree.column("Port", width=70)
         self.tree.heading("SN", text="Device SN")
+        self.tree.heading("Status", text="Status")
+        self.tree.tag_configure("offline", foreground="red")
         self.tree.pack(side="left", fill="x", expand=True)
 
         scrollbar = ttk.Scrollbar(device_frame, orient="vertical", command=self.tree.yview)
@@ -90,6 +78,8 @@ class ZKApp:
         tk.Button(btn_frame, text="Add Device", width=15, command=self.add_device).grid(row=0, column=0, padx=5)
         tk.Button(btn_frame, text="Edit Device", width=15, command=self.edit_device).grid(row=0, column=1, padx=5)
         tk.Button(btn_frame, text="Remove Device", width=15, command=self.remove_device).grid(row=0, column=2, padx=5)
+        tk.Button(btn_frame, text="Import CSV", width=12, command=self.import_devices).grid(row=0, column=3, padx=5)
+        tk.Button(btn_frame, text="Export CSV", width=12, command=self.export_devices).grid(row=0, column=4, padx=5)
 
         # ===== AUTO SYNC =====
         auto_frame = tk.Frame(root)
@@ -97,13 +87,20 @@ class ZKApp:
         tk.Label(auto_frame, text="Auto Sync Interval:", font=("Arial", 10, "bold")).pack(side="left")
 
         self.auto_var = tk.StringVar()
-        intervals = ["Off", "1h", "4h", "6h", "8h", "12h", "24h"]
-        self.auto_menu = ttk.Combobox(auto_frame, textvariable=self.auto_var, values=intervals, state="readonly", width=5)
+        intervals = ["Off", "15m", "30m", "1h", "4h", "6h", "8h", "12h", "24h"]
+        # ✏️ তালিকার বাইরে নিজের মতো লেখা যায়: 45m, 2h, 90s
+        self.auto_menu = ttk.Combobox(auto_frame, textvariable=self.auto_var, values=intervals, width=6)
         self.auto_menu.pack(side="left", padx=5)
         # set default
         current = self.config.get("auto_sync_interval", 0)
         self.auto_var.set(self.seconds_to_label(current))
         self.auto_menu.bind("<<ComboboxSelected>>", self.set_auto_sync)
+        self.auto_menu.bind("<Return>", self.set_auto_sync)
+        self.auto_menu.bind("<FocusOut>", self.set_auto_sync)
+
+        self.live_var = tk.BooleanVar(value=self.config.get("live_mode", False))
+        tk.Checkbutton(auto_frame, text="Live (real-time)", variable=self.live_var,
+                       command=self.toggle_live).pack(side="left", padx=10)
 
         # ===== SYNC & DEV INFO =====
         action_frame = tk.Frame(root)
@@ -112,181 +109,251 @@ class ZKApp:
                                   font=("Arial", 11, "bold"), command=self.run_sync)
         self.sync_btn.grid(row=0, column=0, padx=5)
         
-        tk.Button( action_frame, text="ℹ", width=3, font=("Arial", 11, "bold"), command=self.show_dev_info ).grid(row=0, column=1, padx=5)
+        self.backfill_btn = tk.Button(action_frame, text="Backfill", width=10, command=self.run_backfill)
+        self.backfill_btn.grid(row=0, column=1, padx=5)
+        tk.Button( action_frame, text="ℹ", width=3, font=("Arial", 11, "bold"), command=self.show_dev_info ).grid(row=0, column=2, padx=5)
 
         # ===== LOG BOX =====
         tk.Label(root, text="Log Output", font=("Arial", 10, "bold")).pack()
         self.log_box = scrolledtext.ScrolledText(root, width=95, height=15)
         self.log_box.pack(padx=10, pady=5)
+        self.log_sink = TkLogSink(
+            root, self.log_box,
+            max_lines=self.config.get("log_max_lines", DEFAULT_MAX_LINES),
+            flush_ms=self.config.get("log_flush_ms", DEFAULT_FLUSH_MS),
+            collapse_records=self.config.get("log_collapse_records", True),
+        )
 
         # close handler
-        self.root.protocol("WM_DELETE_WINDOW", self.root.destroy)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Initial populate tree
-        self.refresh_devices()
-
-        # Start auto sync if configured
-        if current > 0:
-            self.schedule_auto_sync(current)
+        self.health = get_health(self.config)
+        self.health.add_listener(lambda key, text: self.root.after(0, self.set_device_status, key, text))
+        self.sync_tree()
+        self.check_devices()
+
+        # ⏰ per-device scheduler; interval 0 হলে কোনো ডিভাইস schedule হয় না
+        self.scheduler = DeviceScheduler(FIXED_API_URL, lambda: self.config, self.log, http=self.http)
+        self.scheduler.start()
+        if self.live_var.get():
+            self.start_live()
         self.log("Data file: " + CONFIG_FILE)
 
     # ===== HELPER =====
     def log(self, text):
-        self.root.after(0, lambda: (self.log_box.insert(tk.END, text + "\n"),
-                                    self.log_box.see(tk.END)))
+        # worker thread থেকেও নিরাপদ; widget-এ লেখা হয় batch করে
+        self.log_sink.write(text)
 
     def seconds_to_label(self, sec):
-        mapping = {0: "Off", 3600: "1h", 14400: "4h", 21600: "6h", 28800: "8h", 43200: "12h", 86400: "24h"}
-        return mapping.get(sec, "Off")
+        if not sec:
+            return "Off"
+        for unit, size in (("h", 3600), ("m", 60)):
+            if sec % size == 0:
+                return f"{sec // size}{unit}"
+        return f"{sec}s"
 
     def label_to_seconds(self, label):
-        mapping = {"Off": 0, "1h": 3600, "4h": 14400, "6h": 21600, "8h": 28800, "12h": 43200, "24h": 86400}
-        return mapping.get(label, 0)
+        # "Off", "90s", "45m", "2h"; শুধু সংখ্যা হলে মিনিট ধরি
+        label = (label or "").strip().lower()
+        if label in ("", "off", "0"):
+            return 0
+        units = {"s": 1, "m": 60, "h": 3600}
+        try:
+            if label[-1] in units:
+                return max(0, int(float(label[:-1]) * units[label[-1]]))
+            return max(0, int(float(label) * 60))
+        except ValueError:
+            return None
 
     # ===== DEVICE MANAGEMENT =====
-    def refresh_devices(self):
-        # Treeview খালি করা
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        devices = self.config.get("devices", [])
-        self.log(f"Refreshing devices: {len(devices)} devices")  # debug log
-
-        # ডিভাইস লিস্ট Treeview-এ দেখানো
-        for dev in devices:
-            ip = str(dev.get("ip", ""))
-            port = str(dev.get("port", 4370))
-            sn = str(dev.get("sn") or "N/A")
-            self.tree.insert("", "end", values=(ip, port, sn))
+    def site_node(self, site):
+        iid = f"site:{site}"
+        if not self.tree.exists(iid):
+            # site-গুলো নাম অনুযায়ী সাজানো থাকে
+            names = [self.tree.item(i, "text") for i in self.tree.get_children("")]
+            index = sum(1 for n in names if n.rsplit(" (", 1)[0] < site)
+            self.tree.insert("", index, iid=iid, text=site, open=True)
+        return iid
+
+    def sync_tree(self, keys=None):
+        """Bring tree rows for ``keys`` (default: all) in line with the registry, touching only what changed."""
+        if keys is None:
+            shown = {i for site in self.tree.get_children("") for i in self.tree.get_children(site)}
+            keys = shown | set(self.registry.by_key)
+        for key in keys:
+            dev = self.registry.get(key)
+            if dev is None:
+                if self.tree.exists(key):
+                    self.tree.delete(key)
+                continue
+            parent = self.site_node(site_of(dev))
+            values = (dev.get("ip", ""), dev.get("port", 4370), dev.get("sn") or "N/A", self.health.status(key))
+            if not self.tree.exists(key):
+                self.tree.insert(parent, "end", iid=key, values=values)
+            else:
+                if self.tree.parent(key) != parent:
+                    self.tree.move(key, parent, "end")
+                if tuple(map(str, self.tree.item(key, "values"))) != tuple(map(str, values)):
+                    self.tree.item(key, values=values)
+            self.set_device_status(key, values[3])
+
+        # খালি site মুছে ফেলি, বাকিগুলোর গণনা ঠিক করি
+        for site in self.tree.get_children(""):
+            count = len(self.tree.get_children(site))
+            if not count:
+                self.tree.delete(site)
+            else:
+                self.tree.item(site, text=f"{site[len('site:'):]} ({count})")
 
-    def add_device(self):
-        ip = simpledialog.askstring("Add Device", "Enter Device IP:")
-        if not ip:
+    def set_device_status(self, key, text):
+        if not self.tree.exists(key) or key.startswith("site:"):
             return
-        
-        port = simpledialog.askstring("Add Device", "Enter Port (default 4370):")
-        password = simpledialog.askstring("Add Device", "Enter Device Password (0 if none):")
-        
+        if self.tree.set(key, "Status") != text:
+            self.tree.set(key, "Status", text)
+        self.tree.item(key, tags=("offline",) if text.startswith("Offline") else ())
+
+    def selected_keys(self):
+        # site row নির্বাচন করলে সেই site-এর সব ডিভাইস
+        keys = []
+        for iid in self.tree.selection():
+            if iid.startswith("site:"):
+                keys += [k for k in self.tree.get_children(iid) if k not in keys]
+            elif iid not in keys:
+                keys.append(iid)
+        return keys
+
+    def check_devices(self):
+        # 📡 শুরুতে একবার সব ডিভাইসের TCP probe, যাতে sync-এর আগেই tree-তে Online/Offline দেখা যায়
+        devices = list(self.config.get("devices", []))
+
+        def worker():
+            with ThreadPoolExecutor(max_workers=min(32, len(devices) or 1)) as pool:
+                results = pool.map(lambda d: probe(d.get("ip"), d.get("port", 4370), self.health.probe_timeout), devices)
+                for dev, (ok, _, error) in zip(devices, results):
+                    self.health.record(device_key(dev), ok, error)
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.refresh_status()
+
+    def refresh_status(self):
+        # "retry in ..." লেখাটা পুরনো না হয়ে যায়
+        for key in self.registry.by_key:
+            self.set_device_status(key, self.health.status(key))
+        self.root.after(30000, self.refresh_status)
+
+    def ask_device(self, title, dev=None):
+        """Prompt for device fields; returns a dict of changes or None if cancelled/invalid."""
+        dev = dev or {}
+        ip = simpledialog.askstring(title, "Enter Device IP:", initialvalue=dev.get("ip", ""))
+        if not ip:
+            return None
+        port = simpledialog.askstring(title, "Enter Port (default 4370):", initialvalue=str(dev.get("port", 4370)))
+        password = simpledialog.askstring(title, "Enter Device Password (0 if none):",
+                                          initialvalue=str(dev.get("password", 0)))
+        site = simpledialog.askstring(title, "Site / branch name:", initialvalue=dev.get("site") or DEFAULT_SITE)
+        interval = simpledialog.askstring(title, "Own sync interval (e.g. 30m, 2h; blank = Auto Sync setting):",
+                                          initialvalue=self.seconds_to_label(dev["sync_interval"]) if dev.get("sync_interval") else "")
         try:
             port = int(port or 4370)
             password = int(password or 0)
         except ValueError:
             messagebox.showerror("Error", "Port and Password must be numbers")
-            return
+            return None
+        interval = self.label_to_seconds(interval) if interval else 0
+        if interval is None:
+            messagebox.showerror("Error", "Interval must look like 30m or 2h")
+            return None
+        site = (site or "").strip()
+        return {"ip": ip.strip(), "port": port, "password": password,
+                "site": site if site and site != DEFAULT_SITE else None,
+                "sync_interval": interval or None}
 
-        # নতুন ডিভাইস ডাইরেক্টলি ফাইলে সংরক্ষণ
+    def add_device(self):
+        changes = self.ask_device("Add Device")
+        if not changes:
+            return
         try:
-            # পুরনো config লোড করি
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-            else:
-                cfg = {"devices": [], "auto_sync_interval": 0}
-
-            # নতুন ডিভাইস যোগ
-            cfg["devices"].append({
-                "ip": ip.strip(),
-                "port": port,
-                "password": password,
-                "sn": None
-            })
-
-            # ফাইলে সংরক্ষণ
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(cfg, f, indent=4)
-
-            # Windows হলে হাইড করে দাও
-            if os.name == "nt":
-                hide_file(CONFIG_FILE)
-
-            messagebox.showinfo("Success", "Device successfully saved to .zkdata")
-
-            # GUI update
-            self.config = cfg  # মেমোরি আপডেট করি যাতে Treeview ঠিক দেখায়
-            self.refresh_devices()
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save device: {e}")
-
+            key = self.registry.add({k: v for k, v in changes.items() if v is not None})
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.registry.save()
+        self.sync_tree([key])
+        self.tree.selection_set(key)
+        self.tree.see(key)
+        self.log(f"➕ Device {key} added")
 
     def edit_device(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showwarning("Edit Device", "Please select a device first")
+        keys = [k for k in self.selected_keys()]
+        if len(keys) != 1:
+            messagebox.showwarning("Edit Device", "Please select one device first")
+            return
+        key = keys[0]
+        changes = self.ask_device("Edit Device", self.registry.get(key))
+        if not changes:
             return
-        idx = self.tree.index(selected[0])
-
         try:
-            # ফাইল থেকে fresh config লোড
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-            else:
-                messagebox.showerror("Error", ".zkdata file not found")
-                return
-
-            dev = cfg["devices"][idx]
-            ip = simpledialog.askstring("Edit Device", "Enter Device IP:", initialvalue=dev["ip"])
-            port = simpledialog.askstring("Edit Device", "Enter Port:", initialvalue=str(dev.get("port", 4370)))
-            password = simpledialog.askstring("Edit Device", "Enter Password:", initialvalue=str(dev.get("password", 0)))
-
-            try:
-                port = int(port or 4370)
-                password = int(password or 0)
-            except ValueError:
-                messagebox.showerror("Error", "Port and Password must be numbers")
-                return
-
-            # Update device in file config
-            cfg["devices"][idx].update({"ip": ip.strip(), "port": port, "password": password})
-
-            # ফাইলে লিখা
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(cfg, f, indent=4)
-            if os.name == "nt":
-                hide_file(CONFIG_FILE)
-
-            # মেমোরি আপডেট ও Treeview refresh
-            self.config = cfg
-            self.refresh_devices()
-            messagebox.showinfo("Success", "Device updated in .zkdata")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to edit device: {e}")
+            new_key = self.registry.update(key, **changes)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.registry.save()
+        self.sync_tree([key, new_key])
+        self.tree.selection_set(new_key)
+        self.log(f"✏️ Device {new_key} updated")
 
     def remove_device(self):
-        selected = self.tree.selection()
-        if not selected:
+        keys = self.selected_keys()
+        if not keys:
             messagebox.showwarning("Remove Device", "Please select a device first")
             return
-        idx = self.tree.index(selected[0])
-
+        if not messagebox.askyesno("Remove Device", f"Remove {len(keys)} device(s)?"):
+            return
+        self.registry.remove(keys)
+        self.registry.save()
+        self.sync_tree(keys)
+        self.log(f"➖ {len(keys)} device(s) removed")
+
+    def import_devices(self):
+        path = filedialog.askopenfilename(title="Import devices", filetypes=[("CSV", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
         try:
-            # ফাইল থেকে fresh config লোড
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-            else:
-                messagebox.showerror("Error", ".zkdata file not found")
-                return
-
-            # remove the device
-            del cfg["devices"][idx]
-
-            # ফাইলে write
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(cfg, f, indent=4)
-            if os.name == "nt":
-                hide_file(CONFIG_FILE)
-
-            # মেমোরি আপডেট ও Treeview refresh
-            self.config = cfg
-            self.refresh_devices()
-            messagebox.showinfo("Success", "Device removed from .zkdata")
-
+            added, updated, errors = self.registry.import_csv(path)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to remove device: {e}")
-
+            messagebox.showerror("Error", f"Failed to import: {e}")
+            return
+        self.registry.save()
+        self.sync_tree(set(added) | set(updated))
+        self.log(f"📥 Imported {len(added)} new, {len(updated)} updated device(s) from {os.path.basename(path)}")
+        for err in errors[:20]:
+            self.log(f"⚠️ {err}")
+        if errors:
+            messagebox.showwarning("Import", f"{len(errors)} row(s) skipped, see log")
+
+    def export_devices(self):
+        path = filedialog.asksaveasfilename(title="Export devices", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            count = self.registry.export_csv(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export: {e}")
+            return
+        self.log(f"📤 Exported {count} device(s) to {path}")
+
+    def learn_sns(self, summaries):
+        # sync-এ পাওয়া SN config-এ রাখি, SN দিয়ে খোঁজা যায়
+        changed = []
+        for s in summaries:
+            dev = self.registry.get(s.get("device"))
+            if dev is not None and s.get("sn") and dev.get("sn") != s["sn"]:
+                changed.append(self.registry.update(s["device"], sn=s["sn"]))
+        if changed:
+            self.registry.save()
+            self.sync_tree(changed)
 
     # ===== SYNC =====
     def run_sync(self):
@@ -303,7 +370,10 @@ class ZKApp:
 
     def sync_thread(self):
         try:
-            fetch_logs_and_sync(FIXED_API_URL, self.config["devices"], self.log)
+            summaries = fetch_logs_and_sync(FIXED_API_URL, self.config["devices"], self.log,
+                                            workers=self.config.get("sync_workers", DEFAULT_WORKERS),
+                                            options=self.config, http=self.http)
+            self.root.after(0, self.learn_sns, summaries)
         except Exception as e:
             self.root.after(0, lambda: (messagebox.showerror("Sync Failed", str(e)), self.root.destroy()))
         finally:
@@ -312,29 +382,94 @@ class ZKApp:
     def finish_sync(self):
         self.sync_thread_running = False
         self.sync_btn.config(state="normal")
-        self.root.protocol("WM_DELETE_WINDOW", self.root.destroy)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        if self.live_stop:
+            self.live_stop.set()
+        if self.scheduler:
+            self.scheduler.stop_event.set()
+        self.root.destroy()
 
     def disable_close(self):
         messagebox.showwarning("Sync Running", "Sync is running. Please wait until it finishes.")
 
+    # ===== BACKFILL =====
+    def run_backfill(self):
+        if not self.config["devices"]:
+            messagebox.showerror("Error", "No devices added!")
+            return
+        default_from = (date.today() - timedelta(days=7)).isoformat()
+        start = simpledialog.askstring("Backfill", "From date (YYYY-MM-DD):", initialvalue=default_from)
+        if not start:
+            return
+        end = simpledialog.askstring("Backfill", "To date (YYYY-MM-DD):", initialvalue=date.today().isoformat())
+        if not end:
+            return
+        try:
+            start, end = parse_date(start), parse_date(end)
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be YYYY-MM-DD")
+            return
+
+        # নির্বাচিত ডিভাইস (বা site) থাকলে শুধু সেগুলো, নইলে সবগুলো
+        devices = [self.registry.get(k) for k in self.selected_keys()] or self.config["devices"]
+
+        self.backfill_btn.config(state="disabled")
+
+        def worker():
+            try:
+                run_backfill(FIXED_API_URL, devices, start, end, self.log, options=self.config, http=self.http)
+            except Exception as e:
+                self.log(f"❌ Backfill failed: {e}")
+            finally:
+                self.root.after(0, lambda: self.backfill_btn.config(state="normal"))
+
+        threading.Thread(target=worker, daemon=True).start()
+
     # ===== AUTO SYNC =====
     def set_auto_sync(self, event=None):
         label = self.auto_var.get()
         interval = self.label_to_seconds(label)
+        if interval is None:
+            messagebox.showerror("Error", "Interval must look like 30m, 2h or Off")
+            self.auto_var.set(self.seconds_to_label(self.config.get("auto_sync_interval", 0)))
+            return
+        if interval == self.config.get("auto_sync_interval", 0):
+            return
         self.config["auto_sync_interval"] = interval
         save_config(self.config)
-        if self.auto_sync_job:
-            self.root.after_cancel(self.auto_sync_job)
-            self.auto_sync_job = None
-        if interval > 0:
-            self.schedule_auto_sync(interval)
-
-    def schedule_auto_sync(self, interval):
-        def job():
-            self.log("⏰ Auto Sync triggered")
-            self.run_sync()
-            self.auto_sync_job = self.root.after(interval * 1000, job)
-        self.auto_sync_job = self.root.after(interval * 1000, job)
+        self.auto_var.set(self.seconds_to_label(interval))
+        self.log(f"⏰ Auto Sync interval: {self.seconds_to_label(interval)}")
+        self.scheduler.wakeup.set()  # নতুন interval সাথে সাথে ধরুক
+
+    # ===== LIVE MODE =====
+    def toggle_live(self):
+        self.config["live_mode"] = self.live_var.get()
+        save_config(self.config)
+        if self.live_var.get():
+            self.start_live()
+        elif self.live_stop:
+            self.log("📴 Stopping live mode...")
+            self.live_stop.set()
+            self.live_stop = None
+
+    def start_live(self):
+        if not self.config["devices"]:
+            self.log("⚠ Live mode needs at least one device")
+            return
+        if self.live_stop:
+            return
+        self.live_stop = stop = threading.Event()
+
+        def worker():
+            try:
+                run_live(FIXED_API_URL, self.config["devices"], self.log, options=self.config,
+                         http=self.http, stop_event=stop)
+            except Exception as e:
+                self.log(f"❌ Live mode failed: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
 
     # ===== DEV INFO =====
     def show_dev_info(self):
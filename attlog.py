@@ -0,0 +1,122 @@
+# attlog.py
+import bisect
+import operator
+from array import array
+from datetime import datetime, time as dtime
+from itertools import islice
+from zk.attendance import Attendance
+
+DAY = 24 * 60 * 60
+
+
+def encode_time(t):
+    """zkemsdk EncodeTime: the device's own 32-bit time code, ordered like the datetimes it encodes."""
+    return (((t.year % 100) * 12 * 31 + (t.month - 1) * 31 + t.day - 1) * DAY
+            + (t.hour * 60 + t.minute) * 60 + t.second)
+
+
+def decode_time(code):
+    second, code = code % 60, code // 60
+    minute, code = code % 60, code // 60
+    hour, code = code % 24, code // 24
+    day, code = code % 31 + 1, code // 31
+    month, year = code % 12 + 1, code // 12 + 2000
+    return datetime(year, month, day, hour, minute, second)
+
+
+def day_code(d):
+    """Time code of ``d`` 00:00; the day's records are ``[day_code(d), day_code(d) + DAY)``."""
+    return encode_time(datetime.combine(d, dtime()))
+
+
+class AttLog:
+    """
+    Fetched attendance log as parallel columns instead of one pyzk
+    ``Attendance`` object per record.
+
+    Times are kept as device time codes in an ``array('I')``, so a day is
+    a plain integer range. Device logs are almost always in time order;
+    when they are (tracked while appending) a day window is found with two
+    binary searches, otherwise by one scan of the integer column.
+    ``Attendance`` objects are only built for the records a caller
+    actually asks for with ``record()`` / ``records()``.
+    """
+
+    __slots__ = ("user_ids", "ts", "status", "punch", "uid", "_ordered")
+
+    def __init__(self, user_ids=None, ts=None, status=None, punch=None, uid=None):
+        self.user_ids = user_ids if user_ids is not None else []
+        self.ts = ts if ts is not None else array("I")
+        self.status = status if status is not None else array("B")
+        self.punch = punch if punch is not None else array("B")
+        self.uid = uid if uid is not None else array("I")
+        self._ordered = None if ts else True  # দেওয়া column হলে দরকারে একবার check
+
+    @classmethod
+    def from_attendance(cls, logs):
+        out = cls()
+        for l in logs:
+            out.append(l.user_id, encode_time(l.timestamp), l.status, l.punch, l.uid or 0)
+        return out
+
+    def append(self, user_id, code, status, punch=0, uid=0):
+        if self._ordered and self.ts and code < self.ts[-1]:
+            self._ordered = False
+        self.user_ids.append(user_id)
+        self.ts.append(code)
+        self.status.append(status)
+        self.punch.append(punch)
+        self.uid.append(uid)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, s):
+        # শুধু slice (যেমন logs[prev_records:]), array slice-ও array
+        if not isinstance(s, slice):
+            raise TypeError("use record(i) for a single record")
+        part = AttLog(self.user_ids[s], self.ts[s], self.status[s], self.punch[s], self.uid[s])
+        if self._ordered and (s.step or 1) > 0:
+            part._ordered = True
+        return part
+
+    def __iter__(self):
+        return (self.record(i) for i in range(len(self)))
+
+    @property
+    def ordered(self):
+        if self._ordered is None:
+            self._ordered = all(map(operator.le, self.ts, islice(self.ts, 1, None)))
+        return self._ordered
+
+    def record(self, i):
+        return Attendance(self.user_ids[i], decode_time(self.ts[i]), self.status[i], self.punch[i], self.uid[i])
+
+    def records(self, indexes):
+        return [self.record(i) for i in indexes]
+
+    def window(self, lo, hi):
+        """Indexes with ``lo <= code < hi``, in time order."""
+        ts = self.ts
+        if self.ordered:
+            return range(bisect.bisect_left(ts, lo), bisect.bisect_left(ts, hi))
+        found = [i for i, t in enumerate(ts) if lo <= t < hi]
+        found.sort(key=ts.__getitem__)
+        return found
+
+    def days(self, first, last=None):
+        """Indexes of records dated ``first`` … ``last`` (inclusive), in time order."""
+        return self.window(day_code(first), day_code(last or first) + DAY)
+
+    def since(self, when):
+        """Records strictly newer than ``when`` as a new AttLog."""
+        idx = self.window(encode_time(when) + 1, 2 ** 32)
+        return AttLog([self.user_ids[i] for i in idx], array("I", (self.ts[i] for i in idx)),
+                      array("B", (self.status[i] for i in idx)), array("B", (self.punch[i] for i in idx)),
+                      array("I", (self.uid[i] for i in idx)))
+
+    def oldest(self):
+        return decode_time(min(self.ts)) if self.ts else None
+
+    def newest(self):
+        return decode_time(max(self.ts)) if self.ts else None
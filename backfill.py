@@ -0,0 +1,158 @@
+# backfill.py
+"""
+Multi-day backfill: send every log in a date range, not just today's.
+
+GUI: "Backfill" button in app.py. CLI:
+
+    python backfill.py --from 2026-10-01 --to 2026-10-17 [--ip 192.168.1.201 ...]
+"""
+import argparse
+import itertools
+import sys
+import time
+from datetime import date, datetime
+from zk import ZK
+from attlog import AttLog, day_code, DAY
+from rawlog import read_attlog
+from user_cache import get_user_directory
+from zk_sync import dup, device_key, device_lock, get_outbox, update_watermarks
+from outbox import OutboxDrainer
+from http_client import get_client
+from zk_config import FIXED_API_URL, read_config
+
+BACKFILL_CHUNK = 500  # logs filtered and committed per step
+
+
+def iter_range(logs, start, end, position=0):
+    """Yield ``(index, log)`` for logs dated within ``[start, end]``, from ``position`` on."""
+    lo, hi = day_code(start), day_code(end) + DAY
+    ts = logs.ts
+    for i in range(position, len(logs)):
+        if lo <= ts[i] < hi:
+            yield i, logs.record(i)
+
+
+def backfill_device(dev, start, end, log_fn, outbox, drainer=None, chunk=BACKFILL_CHUNK, stop_event=None,
+                    options=None):
+    """
+    Fetch one device's log once, then stream the ``[start, end]`` window
+    into the outbox in bounded chunks, saving a resume checkpoint after
+    each committed chunk. Returns True when the range was fully queued.
+    """
+    ip = dev.get("ip")
+
+    def log(text):
+        log_fn(f"[{ip}] {text}")
+
+    conn = None
+    locked_at = None
+    with device_lock(device_key(dev)):
+        try:
+            log(f"🔌 Connecting to {ip}:{dev.get('port', 4370)} for backfill {start} → {end}")
+            conn = ZK(ip, port=dev.get("port", 4370), timeout=5, password=dev.get("password", 0),
+                      ommit_ping=dev.get("ommit_ping", False)).connect()
+            sn = conn.get_serialnumber()
+            conn.read_sizes()
+            users = get_user_directory(options).users_for(sn, conn, log)
+            conn.disable_device()  # 🔒 শুধু log পড়ার সময়টুকু
+            locked_at = time.monotonic()
+            if (options or {}).get("fast_attlog", True):
+                logs = read_attlog(conn, users)[0]
+            else:
+                conn.get_users = lambda: users
+                logs = AttLog.from_attendance(conn.get_attendance())
+            log(f"✔ {len(logs)} log(s) fetched, SN {sn}")
+        except Exception as e:
+            log(f"❌ Backfill fetch failed for {ip}: {e}")
+            return False
+        finally:
+            # 🔓 ডিভাইস সাথে সাথে ছেড়ে দেই, বাকিটা মেমোরি থেকে
+            if conn:
+                try:
+                    conn.enable_device()
+                    conn.disconnect()
+                    if locked_at is not None:
+                        log(f"🔓 Device re-enabled after {time.monotonic() - locked_at:.1f}s")
+                except Exception as e:
+                    log(f"⚠️ Failed to enable/disconnect: {e}")
+
+    # ⏯ একই range আগে অর্ধেক হয়ে থাকলে সেখান থেকে শুরু
+    name = f"backfill:{sn}"
+    ck = dup.get_checkpoint(name) or {}
+    position = 0
+    if ck.get("start") == start.isoformat() and ck.get("end") == end.isoformat() and ck.get("position", 0) <= len(logs):
+        position = ck["position"]
+        log(f"⏯ Resuming backfill at log {position}/{len(logs)}")
+
+    if start.isoformat() < outbox.ledger_since[:10]:
+        # পুরনো version কী পাঠিয়েছিল ledger জানে না, server-কে duplicate সামলাতে হবে
+        log(f"⚠️ Logs before {outbox.ledger_since[:10]} may already have been sent by an earlier version")
+
+    queued = 0
+    it = iter_range(logs, start, end, position)
+    while True:
+        batch = list(itertools.islice(it, chunk))
+        if not batch:
+            break
+        # 📒 এক সপ্তাহের পুরনো range-ও: outbox ছাড়াও sent ledger দেখে, আগে পাঠানো আর যায় না
+        new = outbox.unsent(sn, [l for _, l in batch])
+        queued += outbox.add(sn, ip, new)
+        position = batch[-1][0] + 1
+        dup.save_checkpoint(name, {"start": start.isoformat(), "end": end.isoformat(), "position": position})
+        if drainer:
+            drainer.notify()
+        log(f"⏳ Backfill {position}/{len(logs)} scanned, {queued} queued")
+
+        if stop_event is not None and stop_event.is_set():
+            log("⏸ Backfill paused, will resume from checkpoint")
+            return False
+
+    dup.save_checkpoint(name, None)
+    log(f"📥 Backfill queued {queued} log(s) for {start} → {end}")
+    return True
+
+
+def run_backfill(api_url, devices, start, end, log_fn, options=None, http=None, stop_event=None):
+    """Backfill every device in turn while a drainer uploads in the background."""
+    outbox = get_outbox(options)
+    drainer = OutboxDrainer(api_url, outbox, log_fn, options, http or get_client(options), stop_event=stop_event)
+    drainer.start()
+    ok = True
+    try:
+        for dev in devices:
+            if stop_event is not None and stop_event.is_set():
+                ok = False
+                break
+            ok = backfill_device(dev, start, end, log_fn, outbox, drainer, stop_event=stop_event,
+                                 options=options) and ok
+    finally:
+        drainer.finish()
+    update_watermarks(outbox, drainer.touched, log_fn)
+    log_fn(f"🎉 Backfill complete! {sum(drainer.sent.values())} log(s) sent")
+    return ok
+
+
+def parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill attendance logs for a date range")
+    parser.add_argument("--from", dest="start", type=parse_date, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=parse_date, default=date.today(), help="last day (default today)")
+    parser.add_argument("--ip", action="append", help="only this device (repeatable)")
+    parser.add_argument("--api-url", default=FIXED_API_URL)
+    args = parser.parse_args(argv)
+
+    cfg = read_config()
+    devices = [d for d in cfg.get("devices", []) if not args.ip or d.get("ip") in args.ip]
+    if not devices:
+        print("❌ No matching devices in config")
+        return 2
+
+    ok = run_backfill(args.api_url, devices, args.start, args.end, lambda t: print(t, flush=True), options=cfg)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
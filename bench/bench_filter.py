@@ -0,0 +1,114 @@
+# bench/bench_filter.py
+"""
+Micro-benchmark of the "today's unseen logs" filter, no device needed.
+
+    python bench/bench_filter.py --records 100000 [--shuffle 0.01] [--out bench/results.jsonl]
+
+Compares the old per-object loop over pyzk ``Attendance`` objects with
+``attlog.AttLog``: converting the object list, filtering columns that are
+already built, and ``rawlog.parse_attlog`` decoding the raw 40-byte
+device buffer straight into columns. ``--shuffle``
+swaps that share of records to simulate a log that is not in time order.
+Reports best-of-``--repeat`` seconds and the memory held by each form.
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from zk.attendance import Attendance
+from fake_device import make_records, encode_time, ATT_RECORD
+from attlog import AttLog
+from rawlog import parse_attlog
+from dedup import DedupIndex
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def held_mb(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return round(size / 2 ** 20, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the attendance filter")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--today-share", type=float, default=0.01)
+    parser.add_argument("--shuffle", type=float, default=0.0, help="share of records swapped out of order")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="append the JSON result to this file")
+    args = parser.parse_args(argv)
+
+    rows = make_records(args.records, today_share=args.today_share)
+    for _ in range(int(len(rows) * args.shuffle)):
+        i, j = random.randrange(len(rows)), random.randrange(len(rows))
+        rows[i], rows[j] = rows[j], rows[i]
+    logs = [Attendance(uid, ts.replace(), status, punch, int(uid)) for uid, ts, status, punch in rows]
+    today = date.today()
+    index = DedupIndex(7)
+    sn = "BENCH"
+
+    def per_object():
+        return sorted((l for l in logs if l.timestamp.date() == today and not index.seen(sn, l)),
+                      key=lambda l: l.timestamp)
+
+    columns = AttLog.from_attendance(logs)
+
+    def columnar():
+        return [l for l in columns.records(columns.days(today)) if not index.seen(sn, l)]
+
+    body = b"".join(ATT_RECORD.pack(int(uid), uid.encode(), status, struct.pack("<I", encode_time(ts)), punch, b"")
+                    for uid, ts, status, punch in rows)
+
+    t_old, old = best(per_object, args.repeat)
+    t_raw, raw = best(lambda: parse_attlog(body, ATT_RECORD.size), args.repeat)
+    assert [(l.user_id, l.timestamp) for l in raw.records(raw.days(today))] == \
+        [(l.user_id, l.timestamp) for l in old]
+    t_convert, _ = best(lambda: AttLog.from_attendance(logs), args.repeat)
+    t_new, new = best(columnar, args.repeat)
+    assert [(l.user_id, l.timestamp) for l in old] == [(l.user_id, l.timestamp) for l in new]
+
+    result = {
+        "records": args.records,
+        "today": len(new),
+        "shuffle": args.shuffle,
+        "ordered": columns.ordered,
+        "per_object_s": round(t_old, 4),
+        "attlog_convert_s": round(t_convert, 4),
+        "attlog_filter_s": round(t_new, 4),
+        "speedup_filter": round(t_old / t_new, 1) if t_new else None,
+        "raw_parse_s": round(t_raw, 4),
+        "objects_mb": held_mb(lambda: [Attendance(uid, ts.replace(), status, punch, int(uid))
+                                       for uid, ts, status, punch in rows]),
+        "attlog_mb": held_mb(lambda: AttLog.from_attendance(logs)),
+        "raw_parse_mb": held_mb(lambda: parse_attlog(body, ATT_RECORD.size)),
+        "at": datetime.now().isoformat(timespec="seconds"),
+    }
+    print(json.dumps(result))
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
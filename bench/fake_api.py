@@ -0,0 +1,100 @@
+# bench/fake_api.py
+"""
+Local stand-in for ``/api/iclock/cdata``.
+
+Accepts single posts and plain or compact batches (answered with
+``{"results": [...]}``), gzip/deflate request bodies, optional
+per-request latency and a 429 + Retry-After on every
+``throttle_every``-th request. ``compact=False`` / ``compression=False``
+make it answer 415 like a server that only knows plain JSON.
+"""
+import json
+import threading
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wire_format import COMPACT, decode, expand
+
+
+class FakeApi:
+    def __init__(self, port=0, latency=0.0, throttle_every=0, retry_after=1, batch=True, compact=True,
+                 compression=True, host="127.0.0.1"):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.batch = batch
+        self.compact = compact
+        self.compression = compression
+        self.bytes_in = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.received = []
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/api/iclock/cdata"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def unique(self):
+        with self.lock:
+            return len({(r.get("device_sn"), r.get("user_id"), r.get("timestamp"), r.get("status")) for r in self.received})
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, যেমন আসল সার্ভার
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, code, body=b"", headers=None):
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                encoding = self.headers.get("Content-Encoding")
+                with api.lock:
+                    api.bytes_in += len(raw)
+                if encoding and not api.compression:
+                    return self._reply(415)
+                body = decode(raw, encoding)
+                if body.get("format") == COMPACT and not api.compact:
+                    return self._reply(400)
+                if api.latency:
+                    time.sleep(api.latency)
+                with api.lock:
+                    api.requests += 1
+                    throttle = api.throttle_every and api.requests % api.throttle_every == 0
+                    if throttle:
+                        api.throttled += 1
+                if throttle:
+                    return self._reply(429, headers={"Retry-After": str(api.retry_after)})
+
+                if "records" in body or "groups" in body:
+                    if not api.batch:
+                        return self._reply(404)
+                    records = expand(body)
+                    with api.lock:
+                        api.received.extend(records)
+                    out = {"results": [{"ok": True} for _ in records]}
+                else:
+                    with api.lock:
+                        api.received.append(body)
+                    out = {"ok": True}
+                self._reply(200, json.dumps(out).encode())
+
+        return Handler
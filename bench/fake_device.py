@@ -0,0 +1,248 @@
+# bench/fake_device.py
+"""
+Simulated ZKTeco terminal speaking the TCP protocol pyzk uses.
+
+Supports connect/exit, enable/disable, serial number, read_sizes, the
+buffered read (1503 prepare, 1504 chunk, 1502 free) for attendance and
+users, clear_attendance and live capture (``push_event``). Latency, link speed and connect failures
+are configurable; time spent disabled is recorded as ``locked_seconds``.
+"""
+import random
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+MACHINE_PREPARE_DATA_1 = 20560  # 0x5050
+MACHINE_PREPARE_DATA_2 = 32130  # 0x7d82
+
+CMD_OPTIONS_RRQ = 11
+CMD_ATTLOG_RRQ = 13
+CMD_USERTEMP_RRQ = 9
+CMD_CLEAR_ATTLOG = 15
+CMD_GET_FREE_SIZES = 50
+CMD_REG_EVENT = 500
+CMD_CONNECT = 1000
+CMD_EXIT = 1001
+CMD_ENABLEDEVICE = 1002
+CMD_DISABLEDEVICE = 1003
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+CMD_FREE_DATA = 1502
+CMD_DATA = 1501
+CMD_ACK_OK = 2000
+CMD_ACK_ERROR = 2001
+
+ATT_RECORD = struct.Struct("<H24sB4sB8s")           # 40-byte attendance record
+USER_RECORD = struct.Struct("<HB8s24sIx7sx24s")     # 72-byte user record
+
+
+def encode_time(t):
+    # zkemsdk.c EncodeTime, same as pyzk's __encode_time
+    return (
+        ((t.year % 100) * 12 * 31 + ((t.month - 1) * 31) + t.day - 1) *
+        (24 * 60 * 60) + (t.hour * 60 + t.minute) * 60 + t.second
+    )
+
+
+def make_records(count, users=50, days=30, today_share=0.05, now=None):
+    """Time-ordered ``(user_id, timestamp, status, punch)`` tuples spread over ``days``."""
+    now = (now or datetime.now()).replace(microsecond=0)
+    start_today = now.replace(hour=0, minute=0, second=0)
+    today_count = int(count * today_share)
+    older = count - today_count
+    span = (start_today - timedelta(days=days), start_today)
+    out = []
+    for i in range(older):
+        ts = span[0] + (span[1] - span[0]) * (i / max(1, older))
+        out.append((str(1 + i % users), ts.replace(microsecond=0), 1, i % 2))
+    secs = max(1, int((now - start_today).total_seconds()))
+    for i in range(today_count):
+        ts = start_today + timedelta(seconds=int(secs * (i / max(1, today_count))))
+        out.append((str(1 + i % users), ts, 1, i % 2))
+    return out
+
+
+class FakeDevice:
+    def __init__(self, port=0, sn=None, records=None, users=50, latency=0.0, bytes_per_sec=None,
+                 fail_rate=0.0, host="127.0.0.1"):
+        self.records = list(records or [])
+        self.users = users
+        self.latency = latency              # seconds added to every reply
+        self.bytes_per_sec = bytes_per_sec  # None = unlimited
+        self.fail_rate = fail_rate          # chance a connection is dropped on connect
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(8)
+        self.host, self.port = self.sock.getsockname()
+        self.sn = sn or f"FAKE{self.port}"
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.disabled_at = None
+        self.locked_seconds = 0.0
+        self.bytes_sent = 0
+        self.connections = 0
+        self.live_clients = {}  # socket → session, যারা live event চেয়েছে
+        self.running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def add_records(self, records):
+        with self.lock:
+            self.records.extend(records)
+
+    def push_event(self, user_id, ts=None, status=1, punch=0):
+        """Store a punch and send it to every live-capture connection."""
+        ts = (ts or datetime.now()).replace(microsecond=0)
+        self.add_records([(str(user_id), ts, status, punch)])
+        timehex = bytes([ts.year - 2000, ts.month, ts.day, ts.hour, ts.minute, ts.second])
+        data = struct.pack("<24sBB6s", str(user_id).encode(), status, punch, timehex)
+        with self.lock:
+            clients = list(self.live_clients.items())
+        for client, session in clients:
+            try:
+                self._reply(client, CMD_REG_EVENT, session, 0, data)
+            except OSError:
+                pass
+
+    # ===== SERVER =====
+    def _accept(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _recv_exact(self, client, n):
+        buf = b""
+        while len(buf) < n:
+            part = client.recv(n - len(buf))
+            if not part:
+                raise ConnectionError("closed")
+            buf += part
+        return buf
+
+    def _serve(self, client):
+        session = random.randint(1, 0xFFFF)
+        buffer = b""
+        try:
+            while True:
+                top = self._recv_exact(client, 8)
+                m1, m2, length = struct.unpack("<HHI", top)
+                if (m1, m2) != (MACHINE_PREPARE_DATA_1, MACHINE_PREPARE_DATA_2):
+                    return
+                packet = self._recv_exact(client, length)
+                command, _checksum, _session, reply_id = struct.unpack("<4H", packet[:8])
+                data = packet[8:]
+
+                if self.latency:
+                    time.sleep(self.latency)
+
+                if command == CMD_CONNECT:
+                    if random.random() < self.fail_rate:
+                        return  # 💥 simulated flaky terminal
+                    self.connections += 1
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                elif command == CMD_EXIT:
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                    self._unlock()
+                    return
+                elif command == CMD_DISABLEDEVICE:
+                    with self.lock:
+                        self.disabled_at = self.disabled_at or time.monotonic()
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                elif command == CMD_ENABLEDEVICE:
+                    self._unlock()
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                elif command == CMD_OPTIONS_RRQ:
+                    key = data.split(b"\x00")[0]
+                    value = self.sn.encode() if key == b"~SerialNumber" else b""
+                    self._reply(client, CMD_ACK_OK, session, reply_id, key + b"=" + value + b"\x00")
+                elif command == CMD_GET_FREE_SIZES:
+                    self._reply(client, CMD_ACK_OK, session, reply_id, self._sizes())
+                elif command == CMD_PREPARE_BUFFER:
+                    _, what, fct, ext = struct.unpack("<bhii", data[:11])
+                    buffer = self._attlog() if what == CMD_ATTLOG_RRQ else self._userdata()
+                    self._reply(client, CMD_ACK_OK, session, reply_id, b"\x00" + struct.pack("<I", len(buffer)))
+                elif command == CMD_READ_BUFFER:
+                    start, size = struct.unpack("<ii", data[:8])
+                    chunk = buffer[start:start + size]
+                    if self.bytes_per_sec:
+                        time.sleep(len(chunk) / self.bytes_per_sec)
+                    self.bytes_sent += len(chunk)
+                    self._reply(client, CMD_DATA, session, reply_id, chunk)
+                elif command == CMD_FREE_DATA:
+                    buffer = b""
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                elif command == CMD_REG_EVENT:
+                    flags = struct.unpack("<I", data[:4])[0] if len(data) >= 4 else 0
+                    with self.lock:
+                        if flags:
+                            self.live_clients[client] = session
+                        else:
+                            self.live_clients.pop(client, None)
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                elif command == CMD_ACK_OK:
+                    pass  # live event-এর ack, উত্তর লাগে না
+                elif command == CMD_CLEAR_ATTLOG:
+                    with self.lock:
+                        self.records = []
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+                else:
+                    self._reply(client, CMD_ACK_OK, session, reply_id)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            # connection হারালে আসল ডিভাইসও কিছুক্ষণ পর নিজে থেকে unlock হয়
+            self._unlock()
+            with self.lock:
+                self.live_clients.pop(client, None)
+            client.close()
+
+    def _reply(self, client, code, session, reply_id, data=b""):
+        packet = struct.pack("<4H", code, 0, session, reply_id) + data
+        with self.send_lock:
+            client.sendall(struct.pack("<HHI", MACHINE_PREPARE_DATA_1, MACHINE_PREPARE_DATA_2, len(packet)) + packet)
+
+    def _unlock(self):
+        with self.lock:
+            if self.disabled_at is not None:
+                self.locked_seconds += time.monotonic() - self.disabled_at
+                self.disabled_at = None
+
+    # ===== DATA =====
+    def _sizes(self):
+        fields = [0] * 20
+        fields[4] = self.users
+        fields[8] = len(self.records)
+        fields[14] = 10000
+        fields[15] = 10000
+        fields[16] = 200000  # rec_cap
+        fields[19] = fields[16] - len(self.records)
+        return struct.pack("<20i", *fields) + struct.pack("<3i", 0, 0, 0)
+
+    def _attlog(self):
+        with self.lock:
+            records = list(self.records)
+        body = b"".join(
+            ATT_RECORD.pack(int(uid) if uid.isdigit() else 0, uid.encode(), status,
+                            struct.pack("<I", encode_time(ts)), punch, b"")
+            for uid, ts, status, punch in records
+        )
+        return struct.pack("<I", len(body)) + body
+
+    def _userdata(self):
+        body = b"".join(
+            USER_RECORD.pack(i, 0, b"", f"User {i}".encode(), 1000 + i, b"", str(i).encode())
+            for i in range(1, self.users + 1)
+        )
+        return struct.pack("<I", len(body)) + body
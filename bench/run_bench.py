@@ -0,0 +1,171 @@
+# bench/run_bench.py
+"""
+Offline throughput benchmark: N simulated devices + a local API.
+
+    python bench/run_bench.py --devices 4 --records 20000
+    python bench/run_bench.py --devices 8 --api-latency 0.05 --throttle-every 50 --out bench/results.jsonl
+
+Runs ``fetch_logs_and_sync`` twice: a cold cycle (empty outbox/state) and
+a warm cycle after ``--new`` more punches per device. Each cycle reports
+records/s, cycle time, total device-lock (disabled) time and memory; with
+``--out`` every result is appended as one JSON line so runs can be
+compared over time.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fake_api import FakeApi
+from fake_device import FakeDevice, make_records
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_cycle(name, fetch_logs_and_sync, api, devices, dev_cfgs, options, workers, quiet):
+    lines = []
+    log_fn = lines.append if quiet else (lambda t: print(t, flush=True))
+    locked_before = sum(d.locked_seconds for d in devices)
+    received_before = len(api.received)
+    requests_before, throttled_before, bytes_before = api.requests, api.throttled, api.bytes_in
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    summaries = fetch_logs_and_sync(api.url, dev_cfgs, log_fn, workers=workers, options=options)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fetched = sum(s.get("fetched", 0) for s in summaries)
+    phases = {}
+    for s in summaries:
+        for phase, sec in (s.get("phases") or {}).items():
+            phases[phase] = phases.get(phase, 0.0) + sec
+    sent = len(api.received) - received_before
+    return {
+        "cycle": name,
+        "devices": len(devices),
+        "workers": workers,
+        "fetched": fetched,
+        "sent": sent,
+        "errors": sum(1 for s in summaries if not s.get("ok")),
+        "cycle_s": round(elapsed, 3),
+        "fetched_per_s": round(fetched / elapsed, 1) if elapsed else None,
+        "sent_per_s": round(sent / elapsed, 1) if elapsed else None,
+        "device_lock_s": round(sum(d.locked_seconds for d in devices) - locked_before, 3),
+        "phases_s": {k: round(v, 3) for k, v in phases.items()},
+        "api_requests": api.requests - requests_before,
+        "api_throttled": api.throttled - throttled_before,
+        "api_bytes": api.bytes_in - bytes_before,
+        "py_peak_mb": round(peak / (1024 * 1024), 1),
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch_logs_and_sync against fake devices")
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--records", type=int, default=20000, help="records stored on each device")
+    parser.add_argument("--today-share", type=float, default=0.05, help="fraction of records dated today")
+    parser.add_argument("--new", type=int, default=200, help="punches added per device before the warm cycle")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--device-latency", type=float, default=0.0, help="seconds per device reply")
+    parser.add_argument("--device-bps", type=int, default=None, help="device link speed, bytes/s")
+    parser.add_argument("--device-fail-rate", type=float, default=0.0, help="chance a connect is dropped")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per API request")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every Nth request with 429")
+    parser.add_argument("--no-batch", action="store_true", help="API rejects batch posts (404)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--format", choices=("plain", "compact"), default="plain", help="upload_format option")
+    parser.add_argument("--compression", choices=("none", "gzip", "deflate"), default="none",
+                        help="upload_compression option")
+    parser.add_argument("--in-flight", type=int, default=4, help="upload_max_in_flight option (1 = serial)")
+    parser.add_argument("--ordered", action="store_true", help="upload_ordered option")
+    parser.add_argument("--rate-limit", type=float, default=1000, help="client rate_limit option")
+    parser.add_argument("--out", help="append JSON results to this file")
+    parser.add_argument("--verbose", action="store_true", help="print sync log lines")
+    args = parser.parse_args(argv)
+
+    # 🗂 outbox/state আসল ফোল্ডারে না, temp dir-এ
+    home = tempfile.mkdtemp(prefix="zkbench-")
+    os.environ["ZKSYNC_HOME"] = home
+    from zk_sync import fetch_logs_and_sync
+
+    api = FakeApi(latency=args.api_latency, throttle_every=args.throttle_every, batch=not args.no_batch)
+    devices = [
+        FakeDevice(records=make_records(args.records, today_share=args.today_share),
+                   latency=args.device_latency, bytes_per_sec=args.device_bps, fail_rate=args.device_fail_rate)
+        for _ in range(args.devices)
+    ]
+    dev_cfgs = [{"ip": d.host, "port": d.port, "ommit_ping": True} for d in devices]
+    options = {
+        "batch_size": args.batch_size,
+        "rate_limit": args.rate_limit,
+        "rate_limit_max": max(args.rate_limit, 20),
+        "sync_workers": args.workers,
+        "upload_format": args.format,
+        "upload_compression": args.compression,
+        "upload_max_in_flight": args.in_flight,
+        "upload_ordered": args.ordered,
+    }
+
+    results = []
+    try:
+        for name in ("cold", "warm"):
+            if name == "warm":
+                for d in devices:
+                    d.add_records(make_records(args.new, today_share=1.0))
+            results.append(run_cycle(name, fetch_logs_and_sync, api, devices, dev_cfgs, options,
+                                     args.workers, not args.verbose))
+    finally:
+        for d in devices:
+            d.close()
+        api.close()
+        shutil.rmtree(home, ignore_errors=True)
+
+    meta = {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "records_per_device": args.records,
+        "api_latency": args.api_latency,
+        "device_latency": args.device_latency,
+        "throttle_every": args.throttle_every,
+        "batch_size": args.batch_size,
+        "format": args.format,
+        "compression": args.compression,
+        "in_flight": args.in_flight,
+        "ordered": args.ordered,
+        "unique_received": api.unique(),
+    }
+    for r in results:
+        r.update(meta)
+        print(json.dumps(r, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
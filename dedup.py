@@ -0,0 +1,46 @@
+# dedup.py
+import threading
+from datetime import date, datetime, timedelta
+
+
+class DedupIndex:
+    """
+    Exact in-memory set of ``(sn, user_id, timestamp, status)`` keys,
+    bucketed per day so memory stays bounded: buckets older than
+    ``keep_days`` are dropped by ``evict()``.
+
+    The outbox's UNIQUE constraint remains the exact store on disk; this
+    index only saves it a round trip, so one lookup per fetched record
+    replaces the old ordering-dependent watermark comparison.
+    """
+
+    def __init__(self, keep_days):
+        self.keep_days = keep_days
+        self.days = {}  # date → set of keys
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(sn, user_id, timestamp, status):
+        return (str(sn), str(user_id), timestamp, status)
+
+    def seen(self, sn, log):
+        bucket = self.days.get(log.timestamp.date())
+        return bucket is not None and self.key(sn, log.user_id, log.timestamp, log.status) in bucket
+
+    def add(self, sn, user_id, timestamp, status):
+        with self.lock:
+            self.days.setdefault(timestamp.date(), set()).add(self.key(sn, user_id, timestamp, status))
+
+    def load(self, rows):
+        """Seed from outbox rows of ``(sn, user_id, ts, status)`` with ``ts`` as text."""
+        for sn, user_id, ts, status in rows:
+            self.add(sn, user_id, datetime.fromisoformat(ts), status)
+
+    def evict(self, today=None):
+        cutoff = (today or date.today()) - timedelta(days=self.keep_days)
+        with self.lock:
+            for day in [d for d in self.days if d < cutoff]:
+                del self.days[day]
+
+    def __len__(self):
+        return sum(len(b) for b in self.days.values())
@@ -1 +1,177 @@
+# device_manager.py
+import csv
+import threading
+from zk_sync import device_key
 
+DEFAULT_SITE = "Default"
+CSV_FIELDS = ("ip", "port", "password", "site", "sn", "sync_interval")
+
+
+class DeviceRegistry:
+    """
+    The ``devices`` list of a config dict, indexed by key (ip or ip:port),
+    SN and IP so lookups and edits don't scan or rewrite by row index.
+
+    Every change swaps in a new list (copy-on-write), so the scheduler or
+    a sync thread reading ``cfg["devices"]`` always sees a whole list.
+    Mutating methods return the keys they touched so the GUI can update
+    just those rows; ``save`` writes the config once per operation.
+    """
+
+    def __init__(self, cfg, write_fn=None):
+        self.cfg = cfg
+        self.write_fn = write_fn
+        self.lock = threading.RLock()
+        self.reindex()
+
+    # ===== INDEX =====
+    def reindex(self):
+        with self.lock:
+            self.by_key, self.by_sn, self.by_ip = {}, {}, {}
+            for dev in self.cfg.setdefault("devices", []):
+                self._index(dev)
+
+    def _index(self, dev):
+        key = device_key(dev)
+        self.by_key[key] = dev
+        if dev.get("sn"):
+            self.by_sn[str(dev["sn"])] = key
+        self.by_ip.setdefault(dev.get("ip"), set()).add(key)
+
+    def _unindex(self, dev):
+        key = device_key(dev)
+        self.by_key.pop(key, None)
+        if dev.get("sn") and self.by_sn.get(str(dev["sn"])) == key:
+            del self.by_sn[str(dev["sn"])]
+        keys = self.by_ip.get(dev.get("ip"))
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.by_ip[dev.get("ip")]
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def __contains__(self, key):
+        return key in self.by_key
+
+    def devices(self):
+        return self.cfg["devices"]
+
+    def get(self, key):
+        return self.by_key.get(key)
+
+    def find_sn(self, sn):
+        return self.by_key.get(self.by_sn.get(str(sn)))
+
+    def find_ip(self, ip):
+        return [self.by_key[k] for k in self.by_ip.get(ip, ())]
+
+    def sites(self):
+        return sorted({site_of(dev) for dev in self.by_key.values()})
+
+    def in_site(self, site):
+        return [dev for dev in self.cfg["devices"] if site_of(dev) == site]
+
+    # ===== CHANGES =====
+    def add(self, dev):
+        dev = normalize(dev)
+        key = device_key(dev)
+        with self.lock:
+            if key in self.by_key:
+                raise ValueError(f"Device {key} already exists")
+            self.cfg["devices"] = self.cfg["devices"] + [dev]
+            self._index(dev)
+        return key
+
+    def update(self, key, **changes):
+        """Apply ``changes`` to one device; returns its (possibly new) key. ``None`` values remove a field."""
+        with self.lock:
+            old = self.by_key.get(key)
+            if old is None:
+                raise KeyError(key)
+            dev = dict(old)
+            for k, v in changes.items():
+                if v is None:
+                    dev.pop(k, None)
+                else:
+                    dev[k] = v
+            dev = normalize(dev)
+            new_key = device_key(dev)
+            if new_key != key and new_key in self.by_key:
+                raise ValueError(f"Device {new_key} already exists")
+            self._unindex(old)
+            self.cfg["devices"] = [dev if d is old else d for d in self.cfg["devices"]]
+            self._index(dev)
+        return new_key
+
+    def remove(self, keys):
+        with self.lock:
+            gone = {id(self.by_key[k]) for k in keys if k in self.by_key}
+            for k in keys:
+                if k in self.by_key:
+                    self._unindex(self.by_key[k])
+            self.cfg["devices"] = [d for d in self.cfg["devices"] if id(d) not in gone]
+        return list(keys)
+
+    def save(self):
+        if self.write_fn:
+            self.write_fn(self.cfg)
+
+    # ===== CSV =====
+    def import_csv(self, path):
+        """
+        Upsert devices from a CSV with a header row (``CSV_FIELDS``; only
+        ``ip`` is required). Returns ``(added, updated, errors)`` where the
+        first two are key lists and ``errors`` holds ``"line N: reason"``.
+        """
+        added, updated, errors = [], [], []
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+                if not row.get("ip"):
+                    errors.append(f"line {line}: missing ip")
+                    continue
+                try:
+                    dev = normalize(row)
+                except ValueError as e:
+                    errors.append(f"line {line}: {e}")
+                    continue
+                key = device_key(dev)
+                with self.lock:
+                    if key in self.by_key:
+                        # খালি ঘর মানে আগের মানই থাকবে
+                        changes = {k: v for k, v in dev.items() if row.get(k) not in (None, "")}
+                        updated.append(self.update(key, **changes))
+                    else:
+                        added.append(self.add(dev))
+        return added, updated, errors
+
+    def export_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            w.writeheader()
+            for dev in self.cfg["devices"]:
+                w.writerow({k: ("" if dev.get(k) is None else dev.get(k)) for k in CSV_FIELDS})
+        return len(self.cfg["devices"])
+
+
+def site_of(dev):
+    return dev.get("site") or DEFAULT_SITE
+
+
+def normalize(dev):
+    """Clean types: port/password/sync_interval as int, empty strings dropped, ``sn`` kept (None if unknown)."""
+    out = {k: v for k, v in dev.items() if v not in ("", None) or k == "sn"}
+    out["ip"] = str(out.get("ip", "")).strip()
+    if not out["ip"]:
+        raise ValueError("missing ip")
+    try:
+        out["port"] = int(out.get("port") or 4370)
+        out["password"] = int(out.get("password") or 0)
+        if out.get("sync_interval"):
+            out["sync_interval"] = int(out["sync_interval"])
+    except (TypeError, ValueError):
+        raise ValueError("port, password and sync_interval must be numbers")
+    out.setdefault("sn", None)
+    return out
@@ -0,0 +1,177 @@
+# health.py
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PROBE_TIMEOUT = 1.0     # seconds for the TCP reachability check
+DEFAULT_BREAKER_THRESHOLD = 2   # consecutive failures before a device is skipped
+DEFAULT_BREAKER_BASE = 60       # first open period, doubled on every failed retry
+DEFAULT_BREAKER_MAX = 3600
+MAX_PROBE_WORKERS = 32
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+def probe(ip, port, timeout=DEFAULT_PROBE_TIMEOUT):
+    """TCP connect to the terminal; returns ``(ok, seconds, error)``. No ZK session is opened."""
+    started = time.monotonic()
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True, time.monotonic() - started, None
+    except OSError as e:
+        return False, time.monotonic() - started, str(e) or e.__class__.__name__
+
+
+def wait_text(seconds):
+    return f"{seconds:.0f}s" if seconds < 90 else f"{seconds / 60:.0f}m"
+
+
+class CircuitBreaker:
+    """
+    closed → (``threshold`` failures) → open → (wait) → half-open → one trial
+    → closed on success, open again with a doubled wait on failure.
+    """
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, base=DEFAULT_BREAKER_BASE, max_wait=DEFAULT_BREAKER_MAX):
+        self.threshold = threshold
+        self.base = base
+        self.max_wait = max_wait
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+        self.error = None
+        self.checked = None
+
+    def allow(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN  # ⏳ সময় হয়েছে, একবার চেষ্টা
+            return True
+        return self.state != OPEN
+
+    def retry_in(self, now=None):
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.open_until - now) if self.state == OPEN else 0.0
+
+    def record(self, ok, error=None, now=None):
+        now = time.monotonic() if now is None else now
+        self.checked = time.time()
+        if ok:
+            self.state, self.failures, self.opens, self.error = CLOSED, 0, 0, None
+            return
+        self.failures += 1
+        self.error = error
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            wait = min(self.max_wait, self.base * 2 ** self.opens)
+            self.opens += 1
+            self.state, self.open_until = OPEN, now + wait
+
+
+class HealthRegistry:
+    """
+    Per-device circuit breakers plus a parallel up-front probe.
+
+    ``screen()`` splits a device list into the ones worth connecting to
+    and the ones skipped as offline, without spending a full pyzk connect
+    timeout on known-dead terminals. Listeners are called with
+    ``(key, status_text)`` after every recorded outcome.
+    """
+
+    def __init__(self, probe_timeout=DEFAULT_PROBE_TIMEOUT, threshold=DEFAULT_BREAKER_THRESHOLD,
+                 base=DEFAULT_BREAKER_BASE, max_wait=DEFAULT_BREAKER_MAX):
+        self.probe_timeout = probe_timeout
+        self.breaker_args = (threshold, base, max_wait)
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    @classmethod
+    def from_options(cls, options):
+        options = options or {}
+        return cls(
+            probe_timeout=options.get("probe_timeout", DEFAULT_PROBE_TIMEOUT),
+            threshold=options.get("breaker_threshold", DEFAULT_BREAKER_THRESHOLD),
+            base=options.get("breaker_base", DEFAULT_BREAKER_BASE),
+            max_wait=options.get("breaker_max", DEFAULT_BREAKER_MAX),
+        )
+
+    def breaker(self, key):
+        with self.lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(*self.breaker_args)
+            return self.breakers[key]
+
+    def status(self, key):
+        b = self.breakers.get(key)
+        if b is None or b.checked is None:
+            return "?"
+        if b.state == OPEN:
+            return f"Offline (retry in {wait_text(b.retry_in())})"
+        if b.state == HALF_OPEN:
+            return "Retrying"
+        return "Online" if not b.failures else "Unstable"
+
+    def record(self, key, ok, error=None):
+        b = self.breaker(key)
+        with self.lock:
+            b.record(ok, error)
+        self._notify(key)
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def _notify(self, key):
+        text = self.status(key)
+        for fn in list(self.listeners):
+            try:
+                fn(key, text)
+            except Exception:
+                pass
+
+    def screen(self, devices, key_fn, log_fn):
+        """
+        Return ``(reachable, offline)``: devices to sync, and ``(dev, reason)``
+        pairs skipped because their breaker is open or the probe failed.
+        """
+        offline, candidates = [], []
+        for dev in devices:
+            key = key_fn(dev)
+            b = self.breaker(key)
+            with self.lock:
+                allowed = b.allow()
+            if allowed:
+                candidates.append(dev)
+            else:
+                offline.append((dev, f"offline, skipped (retry in {wait_text(b.retry_in())})"))
+
+        reachable = []
+        if candidates:
+            # 📡 সব ডিভাইস একসাথে, ছোট timeout-এ
+            workers = min(MAX_PROBE_WORKERS, len(candidates))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zk-probe") as pool:
+                results = list(pool.map(
+                    lambda d: probe(d.get("ip"), d.get("port", 4370), self.probe_timeout), candidates))
+            for dev, (ok, _, error) in zip(candidates, results):
+                if ok:
+                    reachable.append(dev)
+                else:
+                    self.record(key_fn(dev), False, error)
+                    offline.append((dev, f"unreachable ({error})"))
+
+        if offline:
+            log_fn(f"📡 {len(reachable)} device(s) reachable, {len(offline)} offline")
+        return reachable, offline
+
+
+_health = None
+_health_lock = threading.Lock()
+
+
+def get_health(options=None):
+    global _health
+    with _health_lock:
+        if _health is None:
+            _health = HealthRegistry.from_options(options)
+        return _health
@@ -0,0 +1,111 @@
+# http_client.py
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 10
+
+
+class HttpClient:
+    """
+    Long-lived keep-alive session shared by every upload.
+
+    One TCP+TLS handshake per pooled connection instead of one per record.
+    ``stats()`` reports how many requests reused a pooled connection.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT):
+        self.pool_size = int(pool_size)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+        self.session = requests.Session()
+        adapter = _CountingAdapter(self, pool_connections=4, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_options(cls, options):
+        options = options or {}
+        return cls(
+            pool_size=options.get("http_pool_size", DEFAULT_POOL_SIZE),
+            connect_timeout=options.get("http_connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=options.get("http_read_timeout", DEFAULT_READ_TIMEOUT),
+        )
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        with self.lock:
+            self.requests += 1
+        return self.session.post(url, **kwargs)
+
+    def _count_new_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused": max(0, self.requests - self.new_connections),
+            }
+
+    def describe(self):
+        s = self.stats()
+        return f"🔗 HTTP: {s['requests']} request(s), {s['new_connections']} new connection(s), {s['reused']} reused"
+
+    def close(self):
+        self.session.close()
+
+
+class _CountingAdapter(HTTPAdapter):
+    # 🔢 urllib3 pools created by this adapter report every fresh handshake back to the client.
+    # connect()-এ গুনি, _new_conn()-এ না: pool বন্ধ হয়ে যাওয়া keep-alive connection-এর
+    # একই object দিয়ে আবার connect করে, সেটাও নতুন TCP (+TLS) handshake
+    def __init__(self, client, **kwargs):
+        self.client = client
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        client = self.client
+
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                client._count_new_connection()
+                return super().connect()
+
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                client._count_new_connection()
+                return super().connect()
+
+        class CountingHTTPPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+
+        class CountingHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPPool, "https": CountingHTTPSPool}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_client(options=None):
+    """Process-wide client, created on first use and reused across sync cycles."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HttpClient.from_options(options)
+        return _shared
@@ -0,0 +1,141 @@
+# live.py
+"""
+Real-time mode: keep a connection open to every terminal and upload
+punches as they happen (pyzk ``live_capture``).
+
+Each device thread alternates an incremental poll (``sync_device``) with
+a live capture session. The poll runs first and again every
+``live_reconcile_interval`` seconds and after every reconnect, so punches
+made while the link was down are still picked up. Live events go through
+the same outbox and drainer as polled logs, so duplicates are dropped
+and nothing is lost if an upload fails.
+
+While a device thread runs, the device is marked live (``set_live``):
+the scheduler and 'Sync Now' leave it to this thread, and the capture
+session holds the device lock like a poll does, so backfill waits.
+"""
+import random
+import threading
+import time
+from datetime import date
+from zk import ZK
+from zk_sync import sync_device, get_outbox, update_watermarks, device_key, device_lock, set_live
+from outbox import OutboxDrainer
+from http_client import get_client
+
+DEFAULT_RECONCILE_INTERVAL = 900  # seconds between incremental polls per device
+DEFAULT_LIVE_TIMEOUT = 10         # socket timeout while waiting for events
+DEFAULT_BACKOFF_MAX = 300         # longest wait between reconnects
+BACKOFF_BASE = 5
+
+
+def backoff_delay(failures, max_delay=DEFAULT_BACKOFF_MAX):
+    # 🎲 exponential backoff + jitter, সব ডিভাইস একসাথে reconnect না করে
+    delay = min(max_delay, BACKOFF_BASE * 2 ** max(0, failures - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class LiveDevice(threading.Thread):
+    def __init__(self, dev, log_fn, outbox, drainer, options, stop_event):
+        super().__init__(name=f"zk-live-{device_key(dev)}", daemon=True)
+        self.dev = dev
+        self.log_fn = log_fn
+        self.outbox = outbox
+        self.drainer = drainer
+        self.stop_event = stop_event
+        self.options = options
+        self.reconcile_interval = options.get("live_reconcile_interval", DEFAULT_RECONCILE_INTERVAL)
+        self.timeout = options.get("live_timeout", DEFAULT_LIVE_TIMEOUT)
+        self.backoff_max = options.get("live_backoff_max", DEFAULT_BACKOFF_MAX)
+        self.events = 0
+
+    def log(self, text):
+        self.log_fn(f"[{self.dev.get('ip')}] {text}")
+
+    def run(self):
+        set_live(device_key(self.dev), True)
+        try:
+            self._run()
+        finally:
+            set_live(device_key(self.dev), False)
+
+    def _run(self):
+        failures = 0
+        while not self.stop_event.is_set():
+            # 🔁 আগে poll: disconnect থাকাকালীন যা মিস হয়েছে তা ধরা পড়ে
+            summary = sync_device(self.dev, self.log_fn, self.outbox, date.today(), self.drainer, self.stop_event,
+                                  options=self.options)
+            if summary["sn"]:
+                update_watermarks(self.outbox, [summary["sn"]], self.log_fn)
+            if summary["ok"]:
+                try:
+                    self.capture(summary["sn"], time.monotonic() + self.reconcile_interval)
+                    failures = 0
+                    continue
+                except Exception as e:
+                    self.log(f"⚠️ Live capture dropped: {e}")
+            failures += 1
+            delay = backoff_delay(failures, self.backoff_max)
+            self.log(f"⏳ Reconnecting in {delay:.0f}s (attempt {failures})")
+            self.stop_event.wait(delay)
+
+    def capture(self, sn, until):
+        """Stream events into the outbox until ``until`` (monotonic) or stop; raises on link errors."""
+        dev = self.dev
+        ip = dev.get("ip")
+        lock = device_lock(device_key(dev))
+        lock.acquire()  # 🔒 capture session-ও একটা connection, backfill এর মধ্যে ঢুকবে না
+        try:
+            conn = ZK(ip, port=dev.get("port", 4370), timeout=5, password=dev.get("password", 0),
+                      ommit_ping=dev.get("ommit_ping", False)).connect()
+        except Exception:
+            lock.release()
+            raise
+        try:
+            self.log("📡 Live capture started")
+            for att in conn.live_capture(new_timeout=self.timeout):
+                # None = timeout, শুধু stop/reconcile check করার সুযোগ
+                if att is not None and att.timestamp.date() == date.today() and not self.outbox.seen(sn, att):
+                    if self.outbox.add(sn, ip, [att]):
+                        self.events += 1
+                        self.drainer.notify()
+                        self.log(f"⚡ Live punch: User {att.user_id} at {att.timestamp}")
+                if self.stop_event.is_set() or time.monotonic() >= until:
+                    conn.end_live_capture = True  # পরের iteration-এ generator নিজে reg_event(0) করে বের হয়
+        finally:
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+            lock.release()
+
+
+def run_live(api_url, devices, log_fn, options=None, http=None, stop_event=None):
+    """
+    Run live mode until ``stop_event`` is set. Blocks; call it from a
+    worker thread in the GUI.
+    """
+    options = options or {}
+    stop_event = stop_event or threading.Event()
+    outbox = get_outbox(options)
+    drainer = OutboxDrainer(api_url, outbox, log_fn, options, http or get_client(options), stop_event=stop_event)
+    drainer.start()
+
+    log_fn(f"📡 Live mode on for {len(devices)} device(s), "
+           f"polling every {options.get('live_reconcile_interval', DEFAULT_RECONCILE_INTERVAL)}s")
+    threads = [LiveDevice(dev, log_fn, outbox, drainer, options, stop_event) for dev in devices]
+    for t in threads:
+        t.start()
+
+    try:
+        # 🧹 দীর্ঘ সময় চললেও পুরনো sent row আর dedup bucket জমে না
+        while not stop_event.wait(options.get("live_reconcile_interval", DEFAULT_RECONCILE_INTERVAL)):
+            outbox.prune()
+    finally:
+        stop_event.set()
+        for t in threads:
+            t.join()
+        drainer.finish()
+        update_watermarks(outbox, drainer.touched, log_fn)
+        log_fn(f"📴 Live mode stopped, {sum(t.events for t in threads)} live punch(es), "
+               f"{sum(drainer.sent.values())} log(s) sent")
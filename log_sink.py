@@ -0,0 +1,67 @@
+# log_sink.py
+import threading
+import tkinter as tk
+from collections import deque
+
+DEFAULT_MAX_LINES = 2000
+DEFAULT_FLUSH_MS = 200
+RECORD_MARK = "✅ Synced →"
+
+
+class TkLogSink:
+    """
+    Thread-safe log target for a Tk text widget.
+
+    Worker threads only append to a buffer; the Tk thread flushes it every
+    ``flush_ms`` in one insert, so a big sync costs a few callbacks per
+    second instead of one per line. The widget keeps at most ``max_lines``
+    (oldest lines dropped). With ``collapse_records`` the per-record
+    "✅ Synced → User ..." lines become one running counter per flush.
+    """
+
+    def __init__(self, root, widget, max_lines=DEFAULT_MAX_LINES, flush_ms=DEFAULT_FLUSH_MS,
+                 collapse_records=True):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.flush_ms = flush_ms
+        self.collapse_records = collapse_records
+        self.lines = deque(maxlen=max_lines)  # flush-এর আগেই যা widget-এ থাকবে না তা রাখার দরকার নেই
+        self.lock = threading.Lock()
+        self.synced = 0        # collapsed lines waiting for the next flush
+        self.synced_total = 0
+        self.root.after(self.flush_ms, self._flush)
+
+    def write(self, text):
+        with self.lock:
+            if self.collapse_records and RECORD_MARK in text:
+                self.synced += 1
+                self.synced_total += 1
+            else:
+                if text.startswith("🔄"):
+                    self.synced_total = 0  # নতুন sync, counter আবার শূন্য থেকে
+                self.lines.append(text)
+
+    __call__ = write
+
+    def _flush(self):
+        try:
+            with self.lock:
+                lines, self.lines = list(self.lines), deque(maxlen=self.max_lines)
+                synced, self.synced = self.synced, 0
+                total = self.synced_total
+
+            if synced:
+                lines.append(f"✅ Synced {total} log(s) so far (+{synced})")
+            if lines:
+                self.widget.insert(tk.END, "\n".join(lines) + "\n")
+                self._trim()
+                self.widget.see(tk.END)
+        finally:
+            self.root.after(self.flush_ms, self._flush)
+
+    def _trim(self):
+        # 🔁 ring buffer: শুধু শেষ max_lines লাইন রাখি
+        count = int(self.widget.index("end-1c").split(".")[0]) - 1
+        if count > self.max_lines:
+            self.widget.delete("1.0", f"{count - self.max_lines + 1}.0")
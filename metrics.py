@@ -0,0 +1,221 @@
+# metrics.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zk_config import state_dir
+
+DEFAULT_JSON_FILE = "sync_stats.json"
+DEFAULT_PROM_FILE = "sync_metrics.prom"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # upload latency, seconds
+
+# 🗂 সর্বশেষ cycle-এর export, /metrics endpoint এখান থেকে পড়ে
+_latest = {"prom": "", "json": None}
+_latest_lock = threading.Lock()
+
+
+class CycleMetrics:
+    """
+    Structured timings and counters for one sync cycle.
+
+    Device phases (connect, read_sizes, users, disable, get_attendance, enable,
+    filter, outbox, clear) are timed per device with ``phase()``; every upload
+    request is recorded with ``observe_upload()`` into a latency histogram
+    with per-status counts. ``export()`` writes the cycle as a JSON stats
+    file and a Prometheus text file, both replaced atomically.
+
+    With ``cumulative`` (the long-lived scheduler) upload figures are
+    counted since start and exported as counters, and each device's entry
+    is that device's last run, copied in with ``add_run()``.
+    """
+
+    def __init__(self, cumulative=False):
+        self.cumulative = cumulative
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.elapsed = None
+        self.lock = threading.Lock()
+        self.devices = {}   # ip → {"sn", "phases": {name: s}, counters...}
+        self.upload = {"requests": 0, "records": 0, "bytes": 0, "throttled": 0, "errors": 0, "codes": {},
+                       "latency_sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+
+    def _device(self, ip):
+        return self.devices.setdefault(ip, {"sn": None, "phases": {}})
+
+    @contextmanager
+    def phase(self, ip, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t
+            with self.lock:
+                phases = self._device(ip)["phases"]
+                phases[name] = phases.get(name, 0.0) + elapsed
+
+    def set_device(self, ip, **values):
+        with self.lock:
+            self._device(ip).update(values)
+
+    def observe_upload(self, seconds, records=1, status=None, nbytes=0):
+        """One HTTP request; ``status`` is the response code, or None for a network error."""
+        with self.lock:
+            u = self.upload
+            u["requests"] += 1
+            u["records"] += records
+            u["bytes"] += nbytes
+            u["latency_sum"] += seconds
+            i = next((i for i, b in enumerate(LATENCY_BUCKETS) if seconds <= b), len(LATENCY_BUCKETS))
+            u["buckets"][i] += 1
+            if status is None:
+                u["errors"] += 1
+                return
+            u["codes"][str(status)] = u["codes"].get(str(status), 0) + 1
+            if status == 429:
+                u["throttled"] += 1
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    def add_run(self, run):
+        """Take over the devices of a finished single-device ``run``; the cycle figures become that run's."""
+        snap = run.snapshot()
+        with self.lock:
+            self.devices.update(snap["devices"])
+            self.started_at, self.started, self.elapsed = run.started_at, run.started, snap["elapsed"]
+
+    # ===== EXPORT =====
+    def snapshot(self):
+        with self.lock:
+            return {
+                "started": datetime_text(self.started_at),
+                "elapsed": self.elapsed if self.elapsed is not None else time.monotonic() - self.started,
+                "devices": {ip: {**d, "phases": dict(d["phases"])} for ip, d in self.devices.items()},
+                "upload": {**self.upload, "codes": dict(self.upload["codes"]),
+                           "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.upload["buckets"]))},
+            }
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                out.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        def dev_labels(ip, d):
+            return {"device": ip, "sn": d.get("sn") or ""}
+
+        devices = snap["devices"].items()
+        metric("zk_sync_cycle_seconds", "gauge", "Duration of the last sync cycle.", [({}, round(snap["elapsed"], 6))])
+        metric("zk_sync_cycle_timestamp_seconds", "gauge", "Unix time the last sync cycle started.",
+               [({}, round(self.started_at, 3))])
+        metric("zk_sync_device_up", "gauge", "1 if the device synced without error in the last cycle.",
+               [(dev_labels(ip, d), int(bool(d.get("ok")))) for ip, d in devices])
+        metric("zk_sync_device_phase_seconds", "gauge", "Time spent per device and phase in the last cycle.",
+               [({**dev_labels(ip, d), "phase": name}, round(s, 6))
+                for ip, d in devices for name, s in d["phases"].items()])
+        for name, key, help_text in (
+                ("fetched", "fetched", "Records downloaded from the device."),
+                ("skipped", "skipped", "Records skipped as already seen."),
+                ("queued", "queued", "New records committed to the outbox."),
+                ("sent", "sent", "Records confirmed by the API."),
+                ("bytes", "bytes", "Approximate bytes downloaded from the device."),
+                ("locked_seconds", "locked", "Time the terminal was disabled (no punching) in the last cycle.")):
+            metric(f"zk_sync_device_{name}", "gauge", help_text,
+                   [(dev_labels(ip, d), round(d.get(key, 0), 6)) for ip, d in devices])
+
+        u = snap["upload"]
+        # 🔢 scheduler-এ upload সংখ্যা শুরু থেকে বাড়তেই থাকে, তাই gauge না counter
+        kind, suffix, period = ("counter", "_total", "since start") if self.cumulative else \
+            ("gauge", "", "in the last cycle")
+        metric(f"zk_sync_upload_requests{suffix}", kind, f"Upload HTTP requests {period} by status code.",
+               [({"code": code}, n) for code, n in sorted(u["codes"].items())] + [({"code": "error"}, u["errors"])])
+        metric(f"zk_sync_upload_throttled{suffix}", kind, f"HTTP 429 replies {period}.", [({}, u["throttled"])])
+        metric(f"zk_sync_upload_records{suffix}", kind, f"Records carried by upload requests {period}.",
+               [({}, u["records"])])
+        metric(f"zk_sync_upload_bytes{suffix}", kind, f"Request body bytes sent (after compression) {period}.",
+               [({}, u["bytes"])])
+
+        name = "zk_sync_upload_latency_seconds"
+        out.append(f"# HELP {name} Upload request latency {period}.")
+        out.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for le, n in u["buckets"].items():
+            cumulative += n
+            out.append(f'{name}_bucket{{le="{le}"}} {cumulative}')
+        out.append(f"{name}_sum {round(u['latency_sum'], 6)}")
+        out.append(f"{name}_count {u['requests']}")
+        return "\n".join(out) + "\n"
+
+    def export(self, json_path=None, prom_path=None):
+        """Write the JSON stats and Prometheus files (either may be None to skip)."""
+        snap = self.snapshot()
+        prom = self.to_prometheus()
+        with _latest_lock:
+            _latest["json"], _latest["prom"] = snap, prom
+            # একাধিক thread একসাথে export করলে ফাইল একজন একজন করে
+            if json_path:
+                _write_atomic(json_path, json.dumps(snap, indent=2, ensure_ascii=False))
+            if prom_path:
+                _write_atomic(prom_path, prom)
+
+
+def datetime_text(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)  # 🔒 scraper কখনো অর্ধেক লেখা ফাইল পড়বে না
+
+
+def export_paths(options=None):
+    """JSON and Prometheus file paths from options; an empty string turns that file off."""
+    options = options or {}
+
+    def resolve(key, default):
+        name = options.get(key, default)
+        return os.path.join(state_dir(), name) if name else None
+
+    return resolve("metrics_json_file", DEFAULT_JSON_FILE), resolve("metrics_prom_file", DEFAULT_PROM_FILE)
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve the last cycle at ``/metrics`` (Prometheus text) and ``/stats`` (JSON) from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with _latest_lock:
+                prom, snap = _latest["prom"], _latest["json"]
+            if self.path.startswith("/metrics"):
+                body, ctype = prom.encode(), "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path.startswith("/stats"):
+                body, ctype = json.dumps(snap, ensure_ascii=False).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
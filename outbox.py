@@ -0,0 +1,390 @@
+# outbox.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zk_config import state_dir
+from dedup import DedupIndex
+from uploader import BatchUploader, DEFAULT_BATCH_WINDOW
+from upload_engine import AsyncUploader, endpoint_in_flight
+from rate_limit import get_limiter, backoff_delay, DEFAULT_RETRY_ATTEMPTS, DEFAULT_RETRY_QUEUE_SIZE
+from wire_format import endpoint_encoding
+from user_cache import get_user_directory, enrich, DEFAULT_USER_FIELDS
+
+PENDING, SENT, IN_FLIGHT = 0, 1, 2
+DEFAULT_KEEP_DAYS = 7      # sent rows kept this long for de-duplication
+DRAIN_CHUNK = 100
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_ts(ts):
+    # TS_FORMAT-এর সমান, কিন্তু strftime-এর চেয়ে অনেক দ্রুত (ডিভাইসের সময়ে microsecond থাকে না)
+    if ts.microsecond:
+        ts = ts.replace(microsecond=0)
+    return ts.isoformat(sep=" ")
+
+
+class Outbox:
+    """
+    Durable spool between device fetch and API upload (SQLite, WAL mode).
+
+    A record is committed here before its device is released, and only
+    marked SENT once the API confirms it, so a crash or network drop never
+    loses fetched logs. ``UNIQUE(sn, user_id, ts, status)`` makes re-fetching
+    the same log harmless; ``seen()`` answers the same question from an
+    in-memory DedupIndex before anything touches the database.
+
+    Rows and the index only cover ``keep_days``. The keys of every
+    confirmed record also go to the ``sent_keys`` ledger, which is never
+    pruned (a few dozen bytes per punch), so ``unsent()`` can tell what
+    the API already has in ranges older than that (backfill, retention).
+    ``ledger_since`` is when the ledger was started; anything older was
+    delivered, if at all, before it existed.
+    """
+
+    def __init__(self, path=None, keep_days=DEFAULT_KEEP_DAYS):
+        self.path = path or os.path.join(state_dir(), "outbox.db")
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sn TEXT NOT NULL,
+                    device TEXT,
+                    user_id TEXT NOT NULL,
+                    ts TEXT NOT NULL,
+                    status INTEGER,
+                    state INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created REAL,
+                    sent_at REAL,
+                    UNIQUE (sn, user_id, ts, status)
+                )""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_records_state ON records (state, id)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_records_sn_ts ON records (sn, ts)")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS sent_keys (
+                    sn TEXT NOT NULL,
+                    ts TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    status INTEGER,
+                    PRIMARY KEY (sn, ts, user_id, status)
+                ) WITHOUT ROWID""")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            if not self.db.execute("SELECT 1 FROM meta WHERE key = 'ledger_since'").fetchone():
+                # 📒 প্রথমবার: এখন পর্যন্ত যা SENT আছে সেগুলো দিয়ে ledger শুরু
+                self.db.execute("INSERT INTO meta VALUES ('ledger_since', ?)", (format_ts(datetime.now()),))
+                self.db.execute("INSERT OR IGNORE INTO sent_keys SELECT sn, ts, user_id, status FROM records "
+                                "WHERE state = ?", (SENT,))
+            self.ledger_since = self.db.execute("SELECT value FROM meta WHERE key = 'ledger_since'").fetchone()[0]
+
+        # ↩ আগের run crash করলে যেগুলো upload-এর মাঝপথে ছিল সেগুলো আবার pending
+        with self.lock, self.db:
+            self.db.execute("UPDATE records SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT))
+
+        # 🧠 শেষ কয়েক দিনের সব key মেমোরিতে, প্রতি record-এ একটাই lookup
+        self.keep_days = keep_days
+        self.index = DedupIndex(keep_days)
+        since = (date.today() - timedelta(days=keep_days)).isoformat()
+        with self.lock:
+            self.index.load(self.db.execute(
+                "SELECT sn, user_id, ts, status FROM records WHERE ts >= ?", (since,)))
+
+    def seen(self, sn, log):
+        return self.index.seen(sn, log)
+
+    def add(self, sn, device, logs):
+        """Commit fetched attendance logs; returns how many were new."""
+        now = time.time()
+        rows = [(str(sn), device, str(l.user_id), format_ts(l.timestamp), l.status, now)
+                for l in logs]
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO records (sn, device, user_id, ts, status, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = self.db.total_changes - before
+        for l in logs:
+            self.index.add(sn, l.user_id, l.timestamp, l.status)
+        return added
+
+    def claim(self, after_id=0, limit=DRAIN_CHUNK):
+        """Take PENDING rows for upload so no other drainer sends them too."""
+        with self.lock, self.db:
+            rows = self.db.execute(
+                "SELECT * FROM records WHERE state = ? AND id > ? ORDER BY id LIMIT ?",
+                (PENDING, after_id, limit)).fetchall()
+            self.db.executemany("UPDATE records SET state = ? WHERE id = ?",
+                                [(IN_FLIGHT, r["id"]) for r in rows])
+            return rows
+
+    def has_rows(self, sn):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM records WHERE sn = ? LIMIT 1", (str(sn),)).fetchone() is not None
+
+    def pending_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM records WHERE state = ?", (PENDING,)).fetchone()[0]
+
+    def unconfirmed_count(self, sn):
+        """Rows of ``sn`` the API hasn't confirmed yet (PENDING or IN_FLIGHT)."""
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM records WHERE sn = ? AND state != ?",
+                                   (str(sn), SENT)).fetchone()[0]
+
+    def mark(self, sent_ids, failed_ids):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany("UPDATE records SET state = ?, sent_at = ? WHERE id = ?",
+                                [(SENT, now, i) for i in sent_ids])
+            self.db.executemany("INSERT OR IGNORE INTO sent_keys SELECT sn, ts, user_id, status FROM records "
+                                "WHERE id = ?", [(i,) for i in sent_ids])
+            self.db.executemany("UPDATE records SET state = ?, attempts = attempts + 1 WHERE id = ?",
+                                [(PENDING, i) for i in failed_ids])
+
+    def sent_since(self, since):
+        """``(sn, user_id, ts, status, sent_at)`` of rows confirmed at or after ``since`` (epoch seconds)."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT sn, user_id, ts, status, sent_at FROM records WHERE state = ? AND sent_at >= ?",
+                (SENT, since)).fetchall()
+
+    def adopt(self, sn, keys):
+        """Record ``(user_id, ts, status)`` keys another worker already delivered as SENT; returns how many were new."""
+        now = time.time()
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO records (sn, user_id, ts, status, state, created, sent_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", [(str(sn), u, ts, st, SENT, now, now) for u, ts, st in keys])
+            added = self.db.total_changes - before
+            self.db.executemany("INSERT OR IGNORE INTO sent_keys VALUES (?, ?, ?, ?)",
+                                [(str(sn), ts, u, st) for u, ts, st in keys])
+        for u, ts, st in keys:
+            self.index.add(sn, u, datetime.fromisoformat(ts), st)
+        return added
+
+    def unsent(self, sn, logs):
+        """``logs`` minus those already in the outbox (``seen``) or ever confirmed (the ``sent_keys`` ledger)."""
+        logs = [l for l in logs if not self.seen(sn, l)]
+        if not logs:
+            return logs
+        with self.lock:
+            done = {tuple(r) for r in self.db.execute(
+                "SELECT user_id, ts, status FROM sent_keys WHERE sn = ? AND ts BETWEEN ? AND ?",
+                (str(sn), format_ts(min(l.timestamp for l in logs)), format_ts(max(l.timestamp for l in logs))))}
+        return [l for l in logs if (str(l.user_id), format_ts(l.timestamp), l.status) not in done]
+
+    def confirmed_watermark(self, sn):
+        """Newest SENT timestamp for ``sn`` that has no PENDING record before it."""
+        with self.lock:
+            row = self.db.execute("""
+                SELECT MAX(ts) FROM records
+                WHERE sn = ? AND state = ?
+                  AND ts < COALESCE((SELECT MIN(ts) FROM records WHERE sn = ? AND state != ?), '9999')
+            """, (str(sn), SENT, str(sn), SENT)).fetchone()
+        return row[0]
+
+    def prune(self):
+        cutoff = time.time() - self.keep_days * 86400
+        self.index.evict()
+        with self.lock, self.db:
+            return self.db.execute("DELETE FROM records WHERE state = ? AND sent_at < ?",
+                                   (SENT, cutoff)).rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def row_payload(row):
+    return {
+        "user_id": row["user_id"],
+        "timestamp": row["ts"],
+        "status": row["status"],
+        "device": row["device"],
+        "device_sn": row["sn"]
+    }
+
+
+class OutboxDrainer(threading.Thread):
+    """
+    Uploads PENDING outbox rows in the background while devices are still
+    being fetched. ``finish()`` tells it no more fetches are coming; it then
+    drains what is left and exits. A set ``stop_event`` makes it stop after
+    the current chunk; the rest stays PENDING for the next run.
+
+    Rows that failed go back to PENDING behind the claim cursor; while more
+    fetches may come (scheduler / live mode, where one drainer lives for
+    the whole run) the cursor goes back to the start once their backoff
+    has passed, so they are claimed again.
+
+    With ``upload_max_in_flight`` > 1 requests overlap through an
+    ``AsyncUploader`` and each request's rows are marked as soon as it
+    settles; 1 (the default) sends one request at a time.
+    """
+
+    def __init__(self, api_url, outbox, log_fn, options=None, http=None, stop_event=None, metrics=None):
+        super().__init__(name="outbox-drain", daemon=True)
+        options = options or {}
+        self.outbox = outbox
+        self.log = log_fn
+        self.fetch_done = threading.Event()
+        self.wakeup = threading.Event()
+        self.stop_event = stop_event
+        self.sent = {}       # sn → confirmed count this run
+        self.touched = set()
+        self.chunk = max(DRAIN_CHUNK, int(options.get("batch_size", 1) or 1))
+        self.results = {}    # row id → ok, until marked in the outbox
+        self.outstanding = 0
+        self.retry_at = None  # failed rows আবার claim করার সময় (monotonic)
+        self.users = get_user_directory(options)
+        self.user_fields = tuple(options.get("user_fields", DEFAULT_USER_FIELDS))
+        uploader, extra = BatchUploader, {}
+        if max(endpoint_in_flight(api_url, options), endpoint_in_flight(options.get("batch_url"), options)) > 1:
+            uploader = AsyncUploader
+            extra = {"ordered": bool(options.get("upload_ordered", False)),
+                     "in_flight_for": lambda url: endpoint_in_flight(url, options)}
+        self.uploader = uploader(
+            api_url, log_fn, self._on_result,
+            batch_size=options.get("batch_size", 1),
+            batch_window=options.get("batch_window", DEFAULT_BATCH_WINDOW),
+            batch_url=options.get("batch_url"),
+            http=http,
+            limiter=get_limiter(api_url, options),
+            max_attempts=options.get("retry_max_attempts", DEFAULT_RETRY_ATTEMPTS),
+            retry_queue_size=options.get("retry_queue_size", DEFAULT_RETRY_QUEUE_SIZE),
+            metrics=metrics,
+            encoding_for=lambda url: endpoint_encoding(url, options),
+            stop_event=stop_event,
+            **extra,
+        )
+
+    def notify(self):
+        self.wakeup.set()
+
+    def finish(self):
+        self.fetch_done.set()
+        self.wakeup.set()
+        self.join()
+
+    def _on_result(self, row, ok):
+        self.results[row["id"]] = ok
+        if ok:
+            self.sent[row["sn"]] = self.sent.get(row["sn"], 0) + 1
+        self.touched.add(row["sn"])
+
+    def _settle(self, rows):
+        """Pop the results for ``rows`` as ``(sent_ids, failed_ids)`` and schedule the failed ones' retry."""
+        # যেগুলোর ফল আসেনি (যেমন exception) সেগুলো আবার pending
+        results = [(r["id"], self.results.pop(r["id"], False)) for r in rows]
+        failed = [r["attempts"] + 1 for r, (_, ok) in zip(rows, results) if not ok]
+        if failed:
+            due = time.monotonic() + backoff_delay(min(failed))
+            self.retry_at = due if self.retry_at is None else min(self.retry_at, due)
+        return [i for i, ok in results if ok], [i for i, ok in results if not ok]
+
+    def _mark(self, rows):
+        # 💾 যা confirmed হয়েছে সাথে সাথে outbox-এ লিখে রাখি
+        self.outbox.mark(*self._settle(rows))
+
+    def _rewind(self, done):
+        """True when failed rows are due again; the next claim then starts from the first id."""
+        if done or self.retry_at is None or time.monotonic() < self.retry_at:
+            return False
+        self.retry_at = None
+        return True
+
+    def run(self):
+        try:
+            if isinstance(self.uploader, AsyncUploader):
+                asyncio.run(self._drain_async())
+            else:
+                self._drain()
+        except Exception as e:
+            self.log(f"❌ Outbox drain failed: {e}")
+
+    def _drain(self):
+        cursor = 0
+        while True:
+            if self.stop_event is not None and self.stop_event.is_set():
+                self.log(f"🛑 Upload stopped, {self.outbox.pending_count()} log(s) left in outbox")
+                break
+            # fetch_done আগে পড়তে হবে, নইলে শেষ commit-টা মিস হতে পারে
+            done = self.fetch_done.is_set()
+            rows = self.outbox.claim(after_id=cursor, limit=self.chunk)
+            if not rows:
+                if done:
+                    break
+                if self._rewind(done):
+                    cursor = 0
+                    continue
+                self.wakeup.wait(0.5)
+                self.wakeup.clear()
+                continue
+
+            for row in rows:
+                self.uploader.add(enrich(row_payload(row), self.users, self.user_fields), row)
+            try:
+                self.uploader.finish()
+            finally:
+                self._mark(rows)
+            cursor = rows[-1]["id"]
+
+    async def _drain_async(self):
+        """``_drain()`` with overlapping requests; claims more rows only while fewer than ``chunk × max_in_flight`` are unsettled."""
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        window = self.chunk * self.uploader.max_in_flight   # claimed rows not settled yet
+        cursor = 0
+        try:
+            while True:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    self.log(f"🛑 Upload stopped, {self.outbox.pending_count()} log(s) left in outbox")
+                    break
+                while self.outstanding >= window:
+                    _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                done = self.fetch_done.is_set()
+                # sqlite event loop-এর বাইরে, চলতে থাকা request-গুলো আটকে না যায়
+                rows = await loop.run_in_executor(None, self.outbox.claim, cursor, self.chunk)
+                if not rows:
+                    if done and not tasks:
+                        break
+                    if self._rewind(done):
+                        cursor = 0
+                        continue
+                    if tasks:
+                        _, tasks = await asyncio.wait(tasks, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await loop.run_in_executor(None, self.wakeup.wait, 0.5)
+                        self.wakeup.clear()
+                    continue
+
+                items = [(enrich(row_payload(row), self.users, self.user_fields), row) for row in rows]
+                self.outstanding += len(rows)
+                for unit in self.uploader.units(items):
+                    tasks.add(asyncio.ensure_future(self._upload(unit)))
+                cursor = rows[-1]["id"]
+        finally:
+            if tasks:
+                await asyncio.wait(tasks)
+            self.uploader.close()
+
+    async def _upload(self, unit):
+        try:
+            await self.uploader.deliver(unit)
+        except Exception as e:
+            self.log(f"❌ Upload failed: {e}")
+        finally:
+            try:
+                sent, failed = self._settle([row for _, row, _ in unit])
+                await asyncio.get_running_loop().run_in_executor(None, self.outbox.mark, sent, failed)
+            finally:
+                self.outstanding -= len(unit)
@@ -0,0 +1,148 @@
+# rate_limit.py
+import heapq
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+DEFAULT_RATE = 2.5        # requests/s to start with (the old fixed 0.4s delay)
+DEFAULT_MAX_RATE = 20.0
+MIN_RATE = 0.2
+INCREASE_SHARE = 0.05     # additive step per success, as a share of max_rate
+DEFAULT_RETRY_QUEUE_SIZE = 1000
+DEFAULT_RETRY_ATTEMPTS = 5
+
+
+class RateLimiter:
+    """
+    Token bucket whose refill rate follows what the server accepts.
+
+    Successes raise the rate additively, 429/5xx cut it multiplicatively
+    (AIMD). The additive step defaults to 5% of ``max_rate``, so a halved
+    rate is back within ~10 clean responses whatever the ceiling is. A
+    ``Retry-After`` pauses every caller until it has passed.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, max_rate=DEFAULT_MAX_RATE, burst=None, increase=None):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.increase = increase if increase is not None else self.max_rate * INCREASE_SHARE
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.burst = max(self.burst, min(self.rate, self.max_rate))
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def on_server_error(self):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate * 0.75)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempts, base_delay=1.0, max_delay=60.0):
+    """Exponential backoff with jitter before the ``attempts``-th retry."""
+    return min(max_delay, base_delay * (2 ** (attempts - 1))) * random.uniform(0.5, 1.0)
+
+
+class RetryQueue:
+    """Bounded queue of failed items, each due after an exponential backoff with jitter."""
+
+    def __init__(self, maxsize=DEFAULT_RETRY_QUEUE_SIZE, base_delay=1.0, max_delay=60.0):
+        self.maxsize = maxsize
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.heap = []
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, item, attempts):
+        """Queue ``item`` for its ``attempts``-th retry; False when the queue is full."""
+        if len(self.heap) >= self.maxsize:
+            return False
+        delay = backoff_delay(attempts, self.base_delay, self.max_delay)
+        self.counter += 1
+        heapq.heappush(self.heap, (time.monotonic() + delay, self.counter, item))
+        return True
+
+    def wait_time(self):
+        if not self.heap:
+            return 0.0
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def clear(self):
+        """Remove and return every queued item, due or not."""
+        items = [entry[2] for entry in sorted(self.heap)]
+        self.heap = []
+        return items
+
+    def pop_due(self, limit=None):
+        now = time.monotonic()
+        due = []
+        while self.heap and self.heap[0][0] <= now and (limit is None or len(due) < limit):
+            due.append(heapq.heappop(self.heap)[2])
+        return due
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url, options=None):
+    """One shared limiter per endpoint, so concurrent device workers share its budget."""
+    options = options or {}
+    with _limiters_lock:
+        if url not in _limiters:
+            _limiters[url] = RateLimiter(
+                rate=options.get("rate_limit", DEFAULT_RATE),
+                max_rate=options.get("rate_limit_max", DEFAULT_MAX_RATE),
+            )
+        return _limiters[url]
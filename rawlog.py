@@ -0,0 +1,188 @@
+# rawlog.py
+"""
+Fast path for reading a terminal's attendance log (``fast_attlog``, on by
+default).
+
+pyzk's ``get_attendance()`` downloads the whole ATTLOG buffer and then
+slices it one record at a time (quadratic in the log size) into
+``Attendance`` objects with ``datetime`` fields. Here the buffer goes
+straight into an ``AttLog``: only the time column is unpacked up front
+(``struct.iter_unpack`` over a ``memoryview``); user id, status, punch
+and uid stay in the buffer and are decoded per record when a record is
+actually used. When the previous record count is known, only the bytes
+after it are requested from the device (``CMD_READ_BUFFER`` with an
+offset), so a steady-state sync transfers just the new records.
+
+The tail read uses pyzk 0.9 internals; if they are missing or the device
+answers unexpectedly, the whole buffer is read through the public
+``read_with_buffer()`` instead.
+"""
+import struct
+from array import array
+from operator import itemgetter
+from zk import const
+from attlog import AttLog
+
+HEADER = 4                          # the buffer starts with the byte size of the records
+RECORD_SIZES = (8, 16, 40)
+# field offsets inside one record, by record size (same layouts pyzk decodes)
+LAYOUTS = {
+    40: {"uid": (0, "H"), "user_id": (2, "24s"), "status": (26, "B"), "ts": (27, "I"), "punch": (31, "B")},
+    16: {"user_id": (0, "I"), "ts": (4, "I"), "status": (8, "B"), "punch": (9, "B")},
+    8: {"uid": (0, "H"), "status": (2, "B"), "ts": (3, "I"), "punch": (7, "B")},
+}
+MAX_CHUNK_TCP = 0xFFC0
+MAX_CHUNK_UDP = 16 * 1024
+
+
+class RawColumn:
+    """One field of fixed-size records, read from the buffer on access; slicing copies nothing."""
+
+    __slots__ = ("buf", "rec_size", "field", "convert", "start", "stop")
+
+    def __init__(self, buf, rec_size, offset, fmt, convert=None, start=0, stop=None):
+        self.buf = buf
+        self.rec_size = rec_size
+        self.field = (offset, struct.Struct("<" + fmt))
+        self.convert = convert
+        self.start = start
+        self.stop = len(buf) // rec_size if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            col = RawColumn.__new__(RawColumn)
+            col.buf, col.rec_size, col.field, col.convert = self.buf, self.rec_size, self.field, self.convert
+            col.start, col.stop = self.start + start, self.start + max(start, stop)
+            return col
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        offset, st = self.field
+        value = st.unpack_from(self.buf, (self.start + i) * self.rec_size + offset)[0]
+        return self.convert(value) if self.convert else value
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def _text(raw):
+    return raw.split(b"\x00", 1)[0].decode(errors="ignore")
+
+
+def parse_attlog(body, rec_size, users=()):
+    """
+    ``AttLog`` over ``body`` (whole records, no header). ``users`` maps
+    8/16-byte records to user ids the same way pyzk does.
+    """
+    body = memoryview(body)[:len(body) // rec_size * rec_size]
+    layout = LAYOUTS[rec_size]
+    ts_offset = layout["ts"][0]
+    ts_struct = f"<{ts_offset}xI{rec_size - ts_offset - 4}x"
+    ts = array("I", map(itemgetter(0), struct.iter_unpack(ts_struct, body)))
+
+    def column(name, convert=None):
+        offset, fmt = layout[name]
+        return RawColumn(body, rec_size, offset, fmt, convert)
+
+    if rec_size == 40:
+        user_ids, uid = column("user_id", _text), column("uid")
+    elif rec_size == 8:
+        by_uid = {u.uid: u.user_id for u in users}
+        user_ids, uid = column("uid", lambda v: by_uid.get(v) or str(v)), column("uid")
+    else:
+        by_id = {str(u.user_id): u.uid for u in users}
+        user_ids = column("user_id", str)
+        uid = column("user_id", lambda v: by_id.get(str(v), v))
+    return AttLog(user_ids, ts, column("status"), column("punch"), uid)
+
+
+def record_size(body_size, records):
+    """Record size as pyzk infers it: 8 or 16 when the division says so, else 40."""
+    size = body_size / records if records else 0
+    return int(size) if size in (8, 16) else 40
+
+
+def read_attlog(conn, users=(), skip=0):
+    """
+    Read the attendance log of a connected (and disabled) device.
+
+    Returns ``(log, total, start)``: ``log`` holds device records
+    ``start`` … ``total - 1``. ``start`` equals ``skip`` when only the tail
+    could be read, else 0 (``skip`` is ignored once it isn't below the
+    device's current count).
+    """
+    conn.read_sizes()
+    total = conn.records
+    if not total:
+        return AttLog(), 0, 0
+    if 0 < skip < total:
+        try:
+            tail = _read_tail(conn, total, skip)
+        except Exception:
+            tail = None
+            try:
+                conn.free_data()
+            except Exception:
+                pass
+        if tail is not None:
+            body, rec_size = tail
+            return parse_attlog(body, rec_size, users), total, skip
+
+    data, size = conn.read_with_buffer(const.CMD_ATTLOG_RRQ)
+    if size < HEADER:
+        return AttLog(), total, 0
+    body_size = struct.unpack_from("<I", data)[0]
+    body = memoryview(data)[HEADER:]
+    return parse_attlog(body, record_size(body_size, total), users), total, 0
+
+
+def read_last_time(conn, total):
+    """
+    Time code of the device's last record, read on its own (the tail read
+    with ``skip = total - 1``); None when the device can't answer that way.
+    """
+    if total < 2:
+        return None
+    try:
+        tail = _read_tail(conn, total, total - 1)
+    except Exception:
+        try:
+            conn.free_data()
+        except Exception:
+            pass
+        return None
+    if tail is None:
+        return None
+    log = parse_attlog(*tail)
+    return log.ts[-1] if len(log) else None
+
+
+def _read_tail(conn, total, skip):
+    """``(body, rec_size)`` for records ``skip`` … ``total - 1`` only; None if the device sent the whole log."""
+    send = conn._ZK__send_command
+    response = send(1503, struct.pack("<bhii", 1, const.CMD_ATTLOG_RRQ, 0, 0), 1024)
+    if not response.get("status") or response.get("code") == const.CMD_DATA:
+        # ছোট log ডিভাইস একবারেই পাঠিয়ে দেয়, পুরোটা আবার পড়াই সহজ
+        conn.free_data()
+        return None
+    size = struct.unpack_from("<I", conn._ZK__data, 1)[0]
+    body_size = size - HEADER
+    if body_size % total or body_size // total not in RECORD_SIZES:
+        conn.free_data()
+        return None
+    rec_size = body_size // total
+    max_chunk = MAX_CHUNK_TCP if conn.tcp else MAX_CHUNK_UDP
+    parts, start = [], HEADER + skip * rec_size
+    while start < size:
+        n = min(max_chunk, size - start)
+        parts.append(conn._ZK__read_chunk(start, n))
+        start += n
+    conn.free_data()
+    return b"".join(parts), rec_size
@@ -0,0 +1,72 @@
+# retention.py
+"""
+Opt-in clearing of a terminal's attendance log (``prune_logs``).
+
+ZK terminals can only clear the whole log (``clear_attendance``), so the
+log is cleared only when nothing on it can be lost:
+
+1. every record on the device is in the local archive (``archive/<SN>.csv``,
+   appended and fsynced as logs are fetched);
+2. every record on the device went through the outbox (with pruning on,
+   records from earlier days are queued too, not only today's, unless
+   the outbox's sent ledger shows the API already has them; history from
+   before the ledger existed counts as sent up to the device's last-sync
+   watermark) and is confirmed by the API (no unsent row for the SN),
+   and the count hasn't changed since that fetch;
+3. the oldest record is at least ``prune_keep_days`` old, so the terminal
+   still holds that much history between clears;
+4. with the device disabled, ``read_sizes()`` still shows the same count
+   (no punch slipped in), then the log is cleared and ``read_sizes()``
+   must show it empty.
+
+Settings are read from the device entry first, then the global options.
+"""
+import csv
+import os
+from datetime import datetime, timedelta
+from zk_config import state_dir
+
+DEFAULT_KEEP_DAYS = 30
+ARCHIVE_FIELDS = ("user_id", "timestamp", "status", "punch", "uid")
+
+
+def retention_settings(dev, options=None):
+    """``None`` if pruning is off for this device, else its ``keep_days``."""
+    options = options or {}
+    if not dev.get("prune_logs", options.get("prune_logs", False)):
+        return None
+    return dev.get("prune_keep_days", options.get("prune_keep_days", DEFAULT_KEEP_DAYS))
+
+
+def archive_path(sn):
+    return os.path.join(state_dir(), "archive", f"{sn}.csv")
+
+
+def archive_logs(sn, logs):
+    """Append ``logs`` to the device's archive and fsync; returns how many were written."""
+    path = archive_path(sn)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if new_file:
+            w.writerow(ARCHIVE_FIELDS)
+        w.writerows((l.user_id, l.timestamp.isoformat(sep=" "), l.status, l.punch, l.uid) for l in logs)
+        f.flush()
+        os.fsync(f.fileno())  # 🔒 clear-এর আগে ডিস্কে থাকতেই হবে
+    return len(logs)
+
+
+def prune_blocker(state, records, unconfirmed, keep_days, now=None):
+    """Reason the device log may not be cleared yet, or ``None`` when it is safe."""
+    now = now or datetime.now()
+    if state.get("archived") != records:
+        return f"{state.get('archived', 0)} of {records} record(s) archived"
+    if state.get("queued") != records:
+        return f"{state.get('queued', 0)} of {records} record(s) queued for upload"
+    if unconfirmed:
+        return f"{unconfirmed} upload(s) not confirmed yet"
+    oldest = state.get("oldest")
+    if not oldest or datetime.fromisoformat(oldest) > now - timedelta(days=keep_days):
+        return f"oldest record newer than {keep_days} day(s)"
+    return None
@@ -0,0 +1,192 @@
+# scheduler.py
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from zk_sync import sync_device, get_outbox, update_watermarks, device_key, is_live, DEFAULT_WORKERS
+from outbox import OutboxDrainer
+from http_client import get_client
+from health import get_health
+from metrics import CycleMetrics, export_paths
+
+DEFAULT_JITTER = 0.1              # ±10% of the interval
+DEFAULT_BACKOFF_MAX = 6 * 3600    # longest delay for an unreachable device
+REFRESH_EVERY = 30                # seconds between device-list checks
+PRUNE_EVERY = 3600
+
+
+def device_interval(dev, options):
+    """Per-device ``sync_interval`` (seconds) or the global ``auto_sync_interval``; 0 = not scheduled."""
+    return int(dev.get("sync_interval") or options.get("auto_sync_interval") or 0)
+
+
+def next_delay(interval, failures, jitter=DEFAULT_JITTER, backoff_max=DEFAULT_BACKOFF_MAX):
+    # ❌ টানা fail হলে interval দ্বিগুণ হতে থাকে (সর্বোচ্চ backoff_max), সাথে jitter
+    delay = interval
+    if failures:
+        delay = min(interval * 2 ** failures, max(interval, backoff_max))
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+class DeviceScheduler(threading.Thread):
+    """
+    Runs each device on its own timer instead of the whole fleet at once.
+
+    Every device has its own interval (``sync_interval``, else
+    ``auto_sync_interval``), randomised by ``schedule_jitter`` and doubled
+    after each failed run up to ``schedule_backoff_max``. A device is only
+    put back on the timer once its run has finished, so runs of one device
+    never overlap, and at most ``schedule_max_concurrency`` devices sync at
+    the same time. New devices start at a random point within their first
+    interval so a large fleet spreads out on its own. Each run is screened
+    by the health registry first: an open breaker or a failed TCP probe
+    counts as a failed run and the device backs off without connecting.
+
+    ``get_config()`` is called on every wake-up, so devices added, removed
+    or re-timed in the config are picked up without a restart. With a
+    ``shard`` (ShardCoordinator) only the devices it owns are scheduled,
+    and each run first takes the device's lease.
+    """
+
+    def __init__(self, api_url, get_config, log_fn, http=None, stop_event=None, shard=None):
+        super().__init__(name="zk-scheduler", daemon=True)
+        self.api_url = api_url
+        self.get_config = get_config
+        self.log = log_fn
+        self.http = http
+        self.stop_event = stop_event or threading.Event()
+        self.shard = shard
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.heap = []              # (due, seq, key)
+        self.seq = itertools.count()
+        self.due = {}               # key → due time of its live heap entry
+        self.devices = {}           # key → device dict
+        self.intervals = {}
+        self.failures = {}
+        self.running = set()
+        self.metrics = CycleMetrics(cumulative=True)  # upload সংখ্যা শুরু থেকে, ডিভাইস প্রতি শেষ run
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        self.join()
+
+    def run(self):
+        options = self.get_config()
+        outbox = get_outbox(options)
+        max_conc = int(options.get("schedule_max_concurrency") or options.get("sync_workers") or DEFAULT_WORKERS)
+        drainer = OutboxDrainer(self.api_url, outbox, self.log, options, self.http or get_client(options),
+                                stop_event=self.stop_event, metrics=self.metrics)
+        drainer.start()
+        self.log(f"⏰ Scheduler started (max {max_conc} device(s) at once)")
+        last_prune = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max_conc, thread_name_prefix="zk-sched") as pool:
+            while not self.stop_event.is_set():
+                try:
+                    options = self.get_config()
+                except Exception as e:
+                    self.log(f"⚠️ Cannot read config, keeping current schedule: {e}")
+                self.refresh(options)
+
+                now = time.monotonic()
+                with self.lock:
+                    while self.heap and self.heap[0][0] <= now and len(self.running) < max_conc:
+                        due, _, key = heapq.heappop(self.heap)
+                        if self.due.get(key) != due:
+                            continue  # পুরনো entry (interval বদলেছে বা ডিভাইস বাদ)
+                        del self.due[key]
+                        self.running.add(key)
+                        pool.submit(self.run_device, key, self.devices[key], outbox, drainer, options)
+                    wait = min(self.heap[0][0] - now, REFRESH_EVERY) if self.heap else REFRESH_EVERY
+
+                if time.monotonic() - last_prune >= PRUNE_EVERY:
+                    outbox.prune()
+                    last_prune = time.monotonic()
+                self.wakeup.wait(max(0.0, wait))
+                self.wakeup.clear()
+
+        drainer.finish()
+        update_watermarks(outbox, drainer.touched, self.log)
+        self.log("⏰ Scheduler stopped")
+
+    def refresh(self, options):
+        devices = {device_key(dev): dev for dev in options.get("devices", [])}
+        if self.shard:
+            # 🧩 অন্য worker-এর ডিভাইস config থেকে বাদ দেওয়ার মতোই
+            devices = {key: dev for key, dev in devices.items() if self.shard.owns(key)}
+        now = time.monotonic()
+        with self.lock:
+            for key in list(self.devices):
+                if key not in devices:
+                    self.due.pop(key, None)
+                    self.intervals.pop(key, None)
+            self.devices = devices
+            for key, dev in devices.items():
+                interval = device_interval(dev, options)
+                if interval == self.intervals.get(key):
+                    continue
+                self.intervals[key] = interval
+                self.due.pop(key, None)
+                if interval > 0 and key not in self.running:
+                    # 🎲 প্রথমবার interval-এর মধ্যে যেকোনো সময়, সবাই একসাথে না
+                    self.push(key, now + random.uniform(0, interval))
+
+    def push(self, key, due):
+        self.due[key] = due
+        heapq.heappush(self.heap, (due, next(self.seq), key))
+
+    def run_device(self, key, dev, outbox, drainer, options):
+        summary = {"ok": False, "sn": None}
+        claimed = False
+        try:
+            if is_live(key):
+                self.log(f"[{dev.get('ip')}] 📡 In live capture, skipped")
+                summary["ok"] = True
+                return
+            run = CycleMetrics()
+            # 📡 manual sync-এর মতোই probe আর breaker, মৃত ডিভাইসে পুরো connect timeout নষ্ট হয় না
+            reachable, offline = get_health(options).screen([dev], device_key, self.log)
+            if offline:
+                self.log(f"[{dev.get('ip')}] 📴 {offline[0][1]}")
+                run.set_device(key, sn=dev.get("sn"), ok=False, error=offline[0][1])
+            else:
+                if self.shard:
+                    claimed = self.shard.claim(dev, self.intervals.get(key, 0) / 2)
+                    if not claimed:
+                        self.log(f"[{dev.get('ip')}] 🧩 Synced by another worker this cycle, skipped")
+                        summary["ok"] = True
+                        return
+                dev = {**dev, "ommit_ping": True}
+                summary = sync_device(dev, self.log, outbox, date.today(), drainer, self.stop_event, run, options)
+                if summary["sn"]:
+                    update_watermarks(outbox, [summary["sn"]], self.log)
+            run.finish()
+            self.metrics.add_run(run)
+            json_path, prom_path = export_paths(options)
+            self.metrics.export(json_path, prom_path)
+        except Exception as e:
+            self.log(f"[{dev.get('ip')}] ❌ Scheduled sync failed: {e}")
+        finally:
+            if claimed:
+                try:
+                    self.shard.release(dev, summary["ok"], summary["sn"])
+                except Exception as e:
+                    self.log(f"[{dev.get('ip')}] ⚠️ Cannot release shard lease: {e}")
+            with self.lock:
+                self.running.discard(key)
+                failures = 0 if summary["ok"] else self.failures.get(key, 0) + 1
+                self.failures[key] = failures
+                interval = self.intervals.get(key, 0)
+                if key in self.devices and interval > 0:
+                    delay = next_delay(interval, failures,
+                                       options.get("schedule_jitter", DEFAULT_JITTER),
+                                       options.get("schedule_backoff_max", DEFAULT_BACKOFF_MAX))
+                    self.push(key, time.monotonic() + delay)
+                    if failures:
+                        self.log(f"[{dev.get('ip')}] ⏳ Unreachable {failures}x, next try in {delay / 60:.0f} min")
+            self.wakeup.set()
@@ -0,0 +1,241 @@
+# shard.py
+"""
+Split the device fleet across several daemon workers (one box or many).
+
+Workers heartbeat into a shared SQLite file (``shard_db``). Each one
+builds the same consistent-hash ring from the live workers and only
+schedules the devices that land on it. A worker that misses heartbeats
+for ``shard_lease_ttl`` seconds drops off the ring and only its devices
+move to the others; a worker that stops cleanly leaves at once.
+
+The ring decides who *should* sync a device. Before each run the worker
+also takes a lease on the device row, which fails while someone else
+holds it or ran it successfully less than ``min_gap`` seconds ago, so a
+device is synced once per cycle even while two workers briefly disagree
+on who is alive.
+
+Every worker has its own outbox, so the keys of the records it has
+delivered are copied into the shared file (``sent`` table) on each
+heartbeat and when it leaves. A worker that takes over a device from
+another owner loads that device's keys into its outbox as already SENT,
+so the records the old owner delivered are not sent again; only what
+it hadn't confirmed yet goes out. Keys older than the outbox's
+``keep_days`` are dropped.
+"""
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zk_config import BASE_DIR
+from zk_sync import dup, device_key, get_outbox
+
+DEFAULT_LEASE_TTL = 60   # seconds without a heartbeat before a worker counts as dead
+VNODES = 64              # ring points per worker, evens out the split
+FORGET_AFTER = 10        # × ttl: dead worker rows are deleted after this long
+PUBLISH_OVERLAP = 5      # seconds re-read on each publish, for confirmations committed late
+
+
+def default_db_path(options=None):
+    return (options or {}).get("shard_db") or os.path.join(BASE_DIR, "shards.db")
+
+
+def ring_hash(text):
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, workers, vnodes=VNODES):
+        points = sorted((ring_hash(f"{w}#{i}"), w) for w in workers for i in range(vnodes))
+        self.workers = sorted(set(workers))
+        self.hashes = [h for h, _ in points]
+        self.owners = [w for _, w in points]
+
+    def owner(self, key):
+        if not self.hashes:
+            return None
+        i = bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)
+        return self.owners[i]
+
+
+class ShardCoordinator(threading.Thread):
+    def __init__(self, path, worker_id, log_fn, lease_ttl=DEFAULT_LEASE_TTL, outbox=None):
+        super().__init__(name="zk-shard", daemon=True)
+        self.path = path
+        self.outbox = outbox or get_outbox()
+        self.published = 0.0  # এর পরে confirm হওয়া key-গুলো এখনো shared file-এ যায়নি
+        self.worker_id = worker_id
+        self.log = log_fn
+        self.lease_ttl = lease_ttl
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.ring = HashRing([worker_id])
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    host TEXT,
+                    pid INTEGER,
+                    heartbeat REAL
+                )""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    device TEXT PRIMARY KEY,
+                    owner TEXT,
+                    expires REAL NOT NULL DEFAULT 0,
+                    last_run REAL,
+                    sn TEXT,
+                    watermark TEXT
+                )""")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS sent (
+                    sn TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    ts TEXT NOT NULL,
+                    status INTEGER,
+                    PRIMARY KEY (sn, user_id, ts, status)
+                )""")
+
+    @classmethod
+    def from_options(cls, options, log_fn, worker_id=None):
+        options = options or {}
+        return cls(default_db_path(options),
+                   worker_id or options.get("shard_worker_id") or socket.gethostname(),
+                   log_fn, options.get("shard_lease_ttl", DEFAULT_LEASE_TTL), get_outbox(options))
+
+    # ===== MEMBERSHIP =====
+    def register(self):
+        """Join the ring; raises ValueError if a live worker already uses this id."""
+        now = time.time()
+        host, pid = socket.gethostname(), os.getpid()
+        with self.lock, self.db:
+            row = self.db.execute("SELECT host, pid, heartbeat FROM workers WHERE worker_id = ?",
+                                  (self.worker_id,)).fetchone()
+            if row and row["heartbeat"] >= now - self.lease_ttl and (row["host"], row["pid"]) != (host, pid):
+                raise ValueError(f"Worker id {self.worker_id} is in use by {row['host']} pid {row['pid']}")
+            self.db.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?)",
+                            (self.worker_id, host, pid, now))
+        self.heartbeat()
+
+    def heartbeat(self):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("UPDATE workers SET heartbeat = ? WHERE worker_id = ?", (now, self.worker_id))
+            # 🔒 লম্বা sync চলাকালীন নিজের lease মেয়াদোত্তীর্ণ না হয়
+            self.db.execute("UPDATE leases SET expires = ? WHERE owner = ? AND expires > ?",
+                            (now + self.lease_ttl, self.worker_id, now))
+            self.db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - FORGET_AFTER * self.lease_ttl,))
+            live = [r[0] for r in self.db.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat >= ?", (now - self.lease_ttl,))]
+            # 🤝 upload confirm হওয়ার পর watermark এগোয়, নতুন owner যেন সেটা পায়
+            for row in self.db.execute("SELECT device, sn, watermark FROM leases WHERE owner = ? AND sn IS NOT NULL",
+                                       (self.worker_id,)).fetchall():
+                wm = dup.get_last_sync(row["sn"])
+                if wm and wm.isoformat(sep=" ") > (row["watermark"] or ""):
+                    self.db.execute("UPDATE leases SET watermark = ? WHERE device = ?",
+                                    (wm.isoformat(sep=" "), row["device"]))
+        self.publish()
+        ring = HashRing(live or [self.worker_id])
+        if ring.workers != self.ring.workers:
+            self.log(f"🧩 {len(ring.workers)} worker(s) live: {', '.join(ring.workers)}")
+        self.ring = ring
+
+    def publish(self):
+        """Copy keys of records this worker's outbox confirmed since the last call into the shared file."""
+        started = time.time()
+        rows = self.outbox.sent_since(self.published - PUBLISH_OVERLAP)
+        cutoff = (date.today() - timedelta(days=self.outbox.keep_days)).isoformat()
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR IGNORE INTO sent VALUES (?, ?, ?, ?)",
+                                [(r["sn"], r["user_id"], r["ts"], r["status"]) for r in rows])
+            self.db.execute("DELETE FROM sent WHERE ts < ?", (cutoff,))
+        self.published = started
+
+    def adopt(self, sn):
+        """Load the keys other workers delivered for ``sn`` into this worker's outbox."""
+        cutoff = (date.today() - timedelta(days=self.outbox.keep_days)).isoformat()
+        with self.lock:
+            keys = self.db.execute("SELECT user_id, ts, status FROM sent WHERE sn = ? AND ts >= ?",
+                                   (str(sn), cutoff)).fetchall()
+        added = self.outbox.adopt(sn, [tuple(k) for k in keys])
+        if added:
+            self.log(f"🤝 {added} log(s) of {sn} already sent by another worker, not sending again")
+
+    def leave(self):
+        try:
+            self.publish()
+        except sqlite3.Error as e:
+            self.log(f"⚠️ Could not publish sent logs: {e}")
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self.db.execute("UPDATE leases SET expires = 0 WHERE owner = ?", (self.worker_id,))
+
+    def stop(self):
+        """Leave the ring (others take over at once) after the current runs have released their leases."""
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        else:
+            self.leave()
+
+    def run(self):
+        while not self.stopped.wait(self.lease_ttl / 3):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                self.log(f"⚠️ Shard heartbeat failed: {e}")
+        self.leave()
+
+    # ===== DEVICES =====
+    def owns(self, key):
+        return self.ring.owner(key) == self.worker_id
+
+    def owned(self, devices):
+        return [dev for dev in devices if self.owns(device_key(dev))]
+
+    def claim(self, dev, min_gap=0):
+        """
+        Lease ``dev`` for one run. Returns False if another worker holds it
+        or it was synced less than ``min_gap`` seconds ago. When the device
+        last ran on another worker, the keys that worker delivered and its
+        watermark are adopted first.
+        """
+        key = device_key(dev)
+        now = time.time()
+        with self.lock, self.db:
+            before = self.db.execute("SELECT owner FROM leases WHERE device = ?", (key,)).fetchone()
+            claimed = self.db.execute("""
+                INSERT INTO leases (device, owner, expires) VALUES (?, ?, ?)
+                ON CONFLICT (device) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                WHERE (leases.owner = excluded.owner OR leases.expires < ?)
+                  AND (leases.last_run IS NULL OR leases.last_run <= ?)
+            """, (key, self.worker_id, now + self.lease_ttl, now, now - min_gap)).rowcount
+            row = self.db.execute("SELECT sn, watermark FROM leases WHERE device = ?", (key,)).fetchone()
+        if not claimed:
+            return False
+        if row["sn"] and before and before["owner"] != self.worker_id:
+            self.adopt(row["sn"])
+        if row["sn"] and row["watermark"]:
+            wm = datetime.fromisoformat(row["watermark"])
+            current = dup.get_last_sync(row["sn"])
+            if current is None or wm > current:
+                dup.save_last_sync(row["sn"], wm)  # 🤝 আগের owner যা পাঠিয়েছে তা আবার না যায়
+        return True
+
+    def release(self, dev, ok, sn=None):
+        self.publish()
+        now = time.time()
+        wm = dup.get_last_sync(sn) if sn else None
+        with self.lock, self.db:
+            self.db.execute("""
+                UPDATE leases SET expires = 0,
+                    last_run = CASE WHEN ? THEN ? ELSE last_run END,
+                    sn = COALESCE(?, sn), watermark = COALESCE(?, watermark)
+                WHERE device = ? AND owner = ?
+            """, (ok, now, sn and str(sn), wm and wm.isoformat(sep=" "), device_key(dev), self.worker_id))
@@ -1,41 +1,232 @@
 # sync_dup.py
 import json
+import logging
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import threading
+from zk_config import state_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("zk_sync")  # daemon-এ এর handler (--json-logs সহ), GUI-তে শুধু warning stderr-এ
+
+COMPACT_EVERY = 1000  # journal lines before it is folded into the snapshot
+
+
+@contextmanager
+def file_lock(f):
+    """Hold an exclusive OS lock on open file ``f``, waiting for other processes to release it."""
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    while True:
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            break
+        except OSError:
+            continue  # LK_LOCK ~10s চেষ্টা করে হাল ছাড়ে, আবার অপেক্ষা
+    try:
+        yield
+    finally:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
 
 class SyncDUP:
-    def __init__(self, filename="last_sync.json"):
+    """
+    Per-device sync state: the last-synced watermark and the device state
+    used for incremental reads, indexed in memory by SN.
 
-        # 🔒 Always store file beside this script
-        base_dir = os.path.dirname(os.path.abspath(__file__))
+    Every update is one appended journal line (O(1) regardless of fleet
+    size). On load the snapshot is read and the journal replayed; every
+    ``COMPACT_EVERY`` lines the snapshot is rewritten atomically (temp
+    file + ``os.replace``) and the journal truncated. A torn last line from
+    a crash is ignored on replay.
+
+    The GUI and the daemon (or several daemons) may share one state
+    folder, so every write takes an OS lock on ``<name>.lock`` and first
+    replays what other processes appended since. Each compaction bumps a
+    generation number kept in the snapshot and on the journal's first
+    line; a process that finds a newer generation reloads everything.
+    """
+
+    def __init__(self, filename="last_sync.json", base_dir=None):
+
+        # 🔒 Writable data dir (~/.zkteco_sync inside the frozen exe)
+        base_dir = base_dir or state_dir()
         self.filename = os.path.join(base_dir, filename)
+        self.journal_file = os.path.splitext(self.filename)[0] + ".journal"
+        self.legacy_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+        self.lock = threading.Lock()  # 🧵 একাধিক sync worker একসাথে save করতে পারে
+        # 🔐 একাধিক process (GUI + daemon) একই ফোল্ডারে লিখতে পারে
+        self.lock_file = open(os.path.splitext(self.filename)[0] + ".lock", "a+b")
+
+        # 📥 Load snapshot, then replay journal on top of it
+        with self.lock, file_lock(self.lock_file):
+            self._reload()
+            self.journal = open(self.journal_file, "ab")
+            if self.journal_pos and not self._ends_with_newline():
+                self._write(b"\n")  # অর্ধেক লাইনের সাথে নতুন entry জোড়া না লাগে
 
-        # 📂 If file doesn't exist, create it safely
-        if not os.path.exists(self.filename):
-            with open(self.filename, "w") as f:
-                json.dump({}, f)
+    # ===== LOAD =====
+    def _reload(self):
+        self.last_sync = {}    # sn → datetime
+        self.state = {}        # sn → dict
+        self.checkpoints = {}  # name → dict (e.g. backfill resume points)
+        self.generation = 0    # প্রতি compaction-এ বাড়ে
+        self.journal_lines = 0
+        self.journal_pos = 0   # journal-এর কত byte পর্যন্ত apply হয়েছে
+        if os.path.exists(self.filename):
+            self._load_snapshot(self.filename)
+        elif os.path.exists(self.legacy_file):
+            self._load_snapshot(self.legacy_file)  # পুরনো ভার্সনের ফাইল, script-এর পাশে
+        self._replay_journal()
 
-        # 📥 Load existing data
+    def _catch_up(self):
+        """Apply what other processes wrote since our last read; call with the file lock held."""
+        if self._journal_generation() != self.generation:
+            self._reload()  # অন্য process compact করেছে
+        else:
+            self._replay_journal()
+
+    def _journal_generation(self):
+        try:
+            with open(self.journal_file, "rb") as f:
+                entry = json.loads(f.readline())
+            return entry["v"] if entry["k"] == "gen" else 0
+        except Exception:
+            return 0  # journal নেই বা পুরনো (gen লাইন ছাড়া)
+
+    def _load_snapshot(self, path):
         try:
-            with open(self.filename, "r") as f:
-                self.data = json.load(f)
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
         except Exception as e:
-            print(f"⚠️ Failed to load sync file: {e}")
-            self.data = {}
+            logger.warning(f"⚠️ Failed to load sync file: {e}")
+            return
 
-    def get_last_sync(self, sn):
-        ts = self.data.get(str(sn))
-        if ts:
+        if "version" not in data:
+            # পুরনো format: {sn: iso, "_state": {sn: {...}}}
+            data = {"last_sync": {k: v for k, v in data.items() if k != "_state"},
+                    "state": data.get("_state", {})}
+        for sn, ts in data.get("last_sync", {}).items():
+            self._apply("wm", sn, ts)
+        for sn, st in data.get("state", {}).items():
+            self._apply("state", sn, st)
+        for name, ck in data.get("checkpoints", {}).items():
+            self._apply("ckpt", name, ck)
+        self.generation = data.get("generation", 0)
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, "rb") as f:
+            f.seek(self.journal_pos)
+            data = f.read()
+        for line in data.splitlines(keepends=True):
+            self.journal_pos += len(line)
             try:
-                return datetime.fromisoformat(ts)
-            except:
-                return None
-        return None
+                entry = json.loads(line)
+                self._apply(entry["k"], entry.get("sn"), entry["v"])
+            except Exception:
+                continue  # crash-এ অর্ধেক লেখা লাইন
+            if entry["k"] != "gen":
+                self.journal_lines += 1
 
-    def save_last_sync(self, sn, dt: datetime):
-        self.data[str(sn)] = dt.isoformat()
+    def _apply(self, kind, sn, value):
+        if kind == "wm":
+            try:
+                self.last_sync[str(sn)] = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                pass
+        elif kind == "state":
+            self.state[str(sn)] = value
+        elif kind == "ckpt":
+            if value is None:
+                self.checkpoints.pop(str(sn), None)
+            else:
+                self.checkpoints[str(sn)] = value
+        elif kind == "gen":
+            self.generation = value
+
+    def _ends_with_newline(self):
+        with open(self.journal_file, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    # ===== WRITE =====
+    def _write(self, line):
+        self.journal.write(line)
+        self.journal.flush()
+        self.journal_pos += len(line)
+
+    def _append(self, kind, sn, value):
+        with self.lock, file_lock(self.lock_file):
+            self._catch_up()
+            self._apply(kind, sn, value)
+            self._write((json.dumps({"k": kind, "sn": str(sn), "v": value}) + "\n").encode("utf-8"))
+            self.journal_lines += 1
+            if self.journal_lines >= COMPACT_EVERY:
+                self._compact()
+
+    def _compact(self):
+        self.generation += 1
+        data = {
+            "version": 2,
+            "generation": self.generation,
+            "last_sync": {sn: dt.isoformat() for sn, dt in self.last_sync.items()},
+            "state": self.state,
+            "checkpoints": self.checkpoints,
+        }
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.filename)
+
+        # snapshot নিরাপদে লেখা হয়েছে, এখন journal খালি করা যায়; প্রথম লাইনে নতুন generation
+        self.journal.close()
+        self.journal = open(self.journal_file, "wb")
+        self.journal_pos = 0
+        self._write((json.dumps({"k": "gen", "v": self.generation}) + "\n").encode("utf-8"))
+        self.journal.close()
+        self.journal = open(self.journal_file, "ab")
+        self.journal_lines = 0
 
-        with open(self.filename, "w") as f:
-            json.dump(self.data, f, indent=4)
+    def compact(self):
+        with self.lock, file_lock(self.lock_file):
+            self._catch_up()
+            self._compact()
 
-        print(f"💾 Last sync saved for {sn}: {dt}")
+    # ===== READ / SAVE =====
+    def get_last_sync(self, sn):
+        return self.last_sync.get(str(sn))
+
+    def get_device_state(self, sn):
+        # 📟 Last seen record count / capacity, stored beside the watermark
+        return self.state.get(str(sn))
+
+    def save_device_state(self, sn, state):
+        self._append("state", sn, state)
+
+    def get_checkpoint(self, name):
+        return self.checkpoints.get(str(name))
+
+    def save_checkpoint(self, name, value):
+        # value=None মানে checkpoint মুছে ফেলা
+        self._append("ckpt", name, value)
+
+    def save_last_sync(self, sn, dt: datetime):
+        # লগ লেখে caller (update_watermarks), এখানে আলাদা print নেই
+        self._append("wm", sn, dt.isoformat())
@@ -0,0 +1,19 @@
+# tests/conftest.py
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from zk_config import set_state_dir
+
+# zk_sync import হওয়ার আগেই, যাতে আসল last_sync / outbox-এ হাত না পড়ে
+STATE_DIR = tempfile.mkdtemp(prefix="zktest-")
+set_state_dir(STATE_DIR)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
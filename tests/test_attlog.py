@@ -0,0 +1,61 @@
+# tests/test_attlog.py
+from datetime import date, datetime
+
+from attlog import AttLog, DAY, day_code, encode_time
+
+D = date(2026, 10, 17)
+TIMES = [datetime(2026, 10, 16, 23, 59, 59), datetime(2026, 10, 17, 0, 0, 0), datetime(2026, 10, 17, 12, 0, 0),
+         datetime(2026, 10, 17, 12, 0, 0), datetime(2026, 10, 17, 23, 59, 59), datetime(2026, 10, 18, 0, 0, 0)]
+
+
+def make_log(times):
+    log = AttLog()
+    for i, t in enumerate(times):
+        log.append(str(i), encode_time(t), 1)
+    return log
+
+
+def test_encode_time_keeps_order_across_month_and_year_ends():
+    times = [datetime(2025, 12, 31, 23, 59, 59), datetime(2026, 1, 1), datetime(2026, 1, 31, 23, 59, 59),
+             datetime(2026, 2, 1)]
+    codes = [encode_time(t) for t in times]
+    assert codes == sorted(codes)
+    assert day_code(D) + DAY == day_code(date(2026, 10, 18))
+
+
+def test_days_includes_midnight_and_excludes_next_midnight():
+    log = make_log(TIMES)
+    assert log.ordered
+    assert list(log.days(D)) == [1, 2, 3, 4]
+    assert list(log.days(date(2026, 10, 16), D)) == [0, 1, 2, 3, 4]
+    assert list(log.days(date(2026, 10, 19))) == []
+
+
+def test_window_bounds_are_half_open():
+    log = make_log(TIMES)
+    noon = encode_time(TIMES[2])
+    assert list(log.window(noon, noon + 1)) == [2, 3]
+    assert list(log.window(noon, noon)) == []
+    assert list(log.window(0, 2 ** 32)) == list(range(len(TIMES)))
+
+
+def test_since_is_strictly_newer():
+    log = make_log(TIMES)
+    assert [r.user_id for r in log.since(TIMES[2])] == ["4", "5"]
+    assert len(log.since(TIMES[-1])) == 0
+    assert len(log.since(datetime(2000, 1, 1))) == len(TIMES)
+
+
+def test_unordered_log_gives_the_same_windows_in_time_order():
+    order = [4, 0, 5, 2, 1, 3]
+    log = make_log([TIMES[i] for i in order])
+    assert not log.ordered
+    assert [order[i] for i in log.days(D)] == [1, 2, 3, 4]
+    assert [r.user_id for r in log.since(TIMES[2])] == ["0", "2"]
+
+
+def test_slices_keep_the_ordered_flag():
+    log = make_log(TIMES)
+    part = log[2:]
+    assert part.ordered and len(part) == 4
+    assert list(part.days(D)) == [0, 1, 2]
@@ -0,0 +1,29 @@
+# tests/test_backfill.py
+from datetime import date, timedelta
+
+from backfill import backfill_device
+from fake_device import FakeDevice, make_records
+from outbox import Outbox
+
+
+def test_backfill_after_prune_does_not_requeue_sent_logs(tmp_path):
+    device = FakeDevice(records=make_records(2000, days=30))
+    outbox = Outbox(path=str(tmp_path / "outbox.db"), keep_days=7)
+    dev = {"ip": device.host, "port": device.port, "ommit_ping": True}
+    start, end = date.today() - timedelta(days=20), date.today() - timedelta(days=10)
+    try:
+        assert backfill_device(dev, start, end, lambda text: None, outbox, options={})
+        rows = outbox.claim(limit=100000)
+        assert rows
+        outbox.mark([r["id"] for r in rows], [])
+
+        # keep_days পার হয়ে গেছে: SENT row-গুলো outbox থেকে মুছে গেছে
+        outbox.db.execute("UPDATE records SET sent_at = 0")
+        outbox.prune()
+        assert not outbox.has_rows(str(rows[0]["sn"]))
+
+        assert backfill_device(dev, start, end, lambda text: None, outbox, options={})
+        assert outbox.pending_count() == 0
+    finally:
+        device.close()
+        outbox.close()
@@ -0,0 +1,34 @@
+# tests/test_dedup.py
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from dedup import DedupIndex
+
+
+def punch(day, user="1", status=1):
+    return SimpleNamespace(user_id=user, timestamp=datetime.combine(day, datetime.min.time()).replace(hour=9),
+                           status=status)
+
+
+def test_seen_matches_the_whole_key():
+    index = DedupIndex(keep_days=7)
+    log = punch(date(2026, 10, 18))
+    index.add("SN1", 1, log.timestamp, 1)  # user_id int বা str, একই key
+    assert index.seen("SN1", log)
+    assert not index.seen("SN2", log)
+    assert not index.seen("SN1", punch(date(2026, 10, 18), status=0))
+    assert not index.seen("SN1", punch(date(2026, 10, 17)))
+
+
+def test_evict_drops_only_days_before_the_cutoff():
+    index = DedupIndex(keep_days=7)
+    today = date(2026, 10, 18)
+    for day in (date(2026, 10, 10), date(2026, 10, 11), date(2026, 10, 17)):
+        index.load([("SN1", "1", punch(day).timestamp.isoformat(sep=" "), 1)])
+    assert len(index) == 3
+
+    index.evict(today)
+    assert not index.seen("SN1", punch(date(2026, 10, 10)))
+    assert index.seen("SN1", punch(date(2026, 10, 11)))  # ঠিক keep_days আগের দিন থাকে
+    assert index.seen("SN1", punch(date(2026, 10, 17)))
+    assert len(index) == 2
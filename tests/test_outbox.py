@@ -0,0 +1,73 @@
+# tests/test_outbox.py
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from outbox import Outbox, format_ts
+
+START = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+
+
+def punches(n, user="1"):
+    return [SimpleNamespace(user_id=user, timestamp=START + timedelta(minutes=i), status=1) for i in range(n)]
+
+
+def test_add_ignores_records_already_spooled(tmp_path):
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    logs = punches(3)
+    assert outbox.add("SN1", "10.0.0.1", logs) == 3
+    assert outbox.add("SN1", "10.0.0.1", logs) == 0
+    assert all(outbox.seen("SN1", l) for l in logs)
+    assert not outbox.seen("SN2", logs[0])
+    outbox.close()
+
+
+def test_claim_mark_and_crash_recovery(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path=path)
+    outbox.add("SN1", "10.0.0.1", punches(5))
+
+    first = outbox.claim(limit=2)
+    assert [r["id"] for r in first] == [1, 2]
+    assert [r["id"] for r in outbox.claim(after_id=first[-1]["id"], limit=2)] == [3, 4]
+    assert outbox.pending_count() == 1
+
+    outbox.mark([1], [2])
+    assert outbox.pending_count() == 2          # 2 ফেরত এল, 5 এখনো বাকি
+    assert outbox.unconfirmed_count("SN1") == 4
+    assert [(r["id"], r["attempts"]) for r in outbox.claim(limit=10)] == [(2, 1), (5, 0)]
+    outbox.close()
+
+    # crash-এর পর IN_FLIGHT যা ছিল সব আবার PENDING
+    again = Outbox(path=path)
+    assert again.pending_count() == 4
+    again.close()
+
+
+def test_confirmed_watermark_stops_before_the_first_unsent_record(tmp_path):
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    logs = punches(4)
+    outbox.add("SN1", "10.0.0.1", logs)
+    assert outbox.confirmed_watermark("SN1") is None
+
+    outbox.claim(limit=10)
+    outbox.mark([1, 3, 4], [2])                 # 2 fail, পরেরগুলো আগে পৌঁছাল
+    assert outbox.confirmed_watermark("SN1") == format_ts(logs[0].timestamp)
+
+    outbox.claim(limit=10)
+    outbox.mark([2], [])
+    assert outbox.confirmed_watermark("SN1") == format_ts(logs[3].timestamp)
+    outbox.close()
+
+
+def test_adopt_records_keys_as_sent(tmp_path):
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    logs = punches(3)
+    keys = [(l.user_id, format_ts(l.timestamp), l.status) for l in logs[:2]]
+    assert outbox.adopt("SN1", keys) == 2
+    assert outbox.adopt("SN1", keys) == 0
+    assert outbox.pending_count() == 0
+    assert outbox.confirmed_watermark("SN1") == keys[1][1]
+
+    assert outbox.add("SN1", "10.0.0.1", logs) == 1
+    assert outbox.unsent("SN1", logs) == []
+    outbox.close()
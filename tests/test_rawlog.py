@@ -0,0 +1,47 @@
+# tests/test_rawlog.py
+import struct
+from datetime import datetime
+from types import SimpleNamespace
+
+from attlog import encode_time
+from rawlog import parse_attlog, record_size
+
+T1, T2 = datetime(2026, 10, 17, 8, 59, 30), datetime(2026, 10, 18, 17, 1, 2)
+USERS = [SimpleNamespace(uid=7, user_id="1001"), SimpleNamespace(uid=8, user_id="1002")]
+
+
+def fields(log, i):
+    r = log.record(i)
+    return r.user_id, r.timestamp, r.status, r.punch, r.uid
+
+
+def test_parse_40_byte_records():
+    body = (struct.pack("<H24sBIB8x", 7, b"1001", 1, encode_time(T1), 0)
+            + struct.pack("<H24sBIB8x", 9, b"A-77\x00junk", 4, encode_time(T2), 1))
+    log = parse_attlog(body + b"\x00" * 12, 40)  # অসম্পূর্ণ শেষ record বাদ
+    assert len(log) == 2
+    assert fields(log, 0) == ("1001", T1, 1, 0, 7)
+    assert fields(log, 1) == ("A-77", T2, 4, 1, 9)
+
+
+def test_parse_16_byte_records_maps_user_ids_to_uids():
+    body = struct.pack("<IIBB6x", 1001, encode_time(T1), 1, 0) + struct.pack("<IIBB6x", 5555, encode_time(T2), 0, 1)
+    log = parse_attlog(body, 16, USERS)
+    assert fields(log, 0) == ("1001", T1, 1, 0, 7)
+    assert fields(log, 1) == ("5555", T2, 0, 1, 5555)
+
+
+def test_parse_8_byte_records_maps_uids_to_user_ids():
+    body = struct.pack("<HBIB", 8, 1, encode_time(T1), 1) + struct.pack("<HBIB", 42, 15, encode_time(T2), 0)
+    log = parse_attlog(body, 8, USERS)
+    assert fields(log, 0) == ("1002", T1, 1, 1, 8)
+    assert fields(log, 1) == ("42", T2, 15, 0, 42)
+    assert list(log.ts) == [encode_time(T1), encode_time(T2)]
+
+
+def test_record_size_follows_pyzk():
+    assert record_size(80, 10) == 8
+    assert record_size(160, 10) == 16
+    assert record_size(400, 10) == 40
+    assert record_size(120, 10) == 40
+    assert record_size(0, 0) == 40
@@ -0,0 +1,63 @@
+# tests/test_retention.py
+from datetime import date
+from types import SimpleNamespace
+
+from fake_device import FakeDevice, make_records
+from outbox import Outbox
+from zk_sync import sync_device
+
+OPTIONS = {"prune_logs": True, "prune_keep_days": 1}
+
+
+def claim_all(outbox):
+    rows = outbox.claim(limit=100000)
+    today = date.today().isoformat()
+    return [r["id"] for r in rows if r["ts"].startswith(today)], [r["id"] for r in rows if not r["ts"].startswith(today)]
+
+
+def test_clear_waits_for_earlier_days_to_be_uploaded(tmp_path):
+    device = FakeDevice(records=make_records(2000, today_share=0.1))
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    dev = {"ip": device.host, "port": device.port, "ommit_ping": True}
+    try:
+        first = sync_device(dev, lambda text: None, outbox, options=OPTIONS)
+        assert first["ok"]
+
+        # শুধু আজকের 200টা confirmed, আগের দিনের 1800টা এখনো যায়নি
+        today_ids, older_ids = claim_all(outbox)
+        assert len(today_ids) == 200
+        outbox.mark(today_ids, older_ids)
+
+        second = sync_device(dev, lambda text: None, outbox, options=OPTIONS)
+        assert second["ok"] and second["cleared"] == 0
+        assert len(device.records) == 2000
+
+        assert len(older_ids) == 1800
+        outbox.claim(limit=100000)
+        outbox.mark(older_ids, [])
+        third = sync_device(dev, lambda text: None, outbox, options=OPTIONS)
+        assert third["ok"] and third["cleared"] == 2000
+        assert not device.records
+    finally:
+        device.close()
+        outbox.close()
+
+
+def test_enabling_prune_queues_only_what_the_api_has_not_confirmed(tmp_path):
+    device = FakeDevice(records=make_records(2000, today_share=0.1))
+    outbox = Outbox(path=str(tmp_path / "outbox.db"), keep_days=7)
+    dev = {"ip": device.host, "port": device.port, "ommit_ping": True}
+    try:
+        # আগের 1800-এর মধ্যে 1700টা অনেক আগেই পাঠানো, outbox থেকে prune হয়ে গেছে
+        older = [SimpleNamespace(user_id=u, timestamp=ts, status=s) for u, ts, s, _ in device.records[:1700]]
+        outbox.add(device.sn, device.host, older)
+        outbox.mark([r["id"] for r in outbox.claim(limit=100000)], [])
+        outbox.db.execute("UPDATE records SET sent_at = 0")
+        outbox.prune()
+
+        summary = sync_device(dev, lambda text: None, outbox, options=OPTIONS)
+        assert summary["ok"] and summary["cleared"] == 0
+        assert summary["queued"] == 100 + 200
+    finally:
+        device.close()
+        outbox.close()
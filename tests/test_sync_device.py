@@ -0,0 +1,39 @@
+# tests/test_sync_device.py
+from datetime import datetime, timedelta
+
+from fake_device import FakeDevice, make_records
+from outbox import Outbox
+from zk_sync import BLIND_SKIPS, sync_device
+
+
+def test_log_refilled_to_the_same_count_is_fetched_again(tmp_path):
+    device = FakeDevice(records=make_records(300, today_share=0.5))
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    dev = {"ip": device.host, "port": device.port, "ommit_ping": True}
+    try:
+        first = sync_device(dev, lambda text: None, outbox)
+        assert first["ok"] and first["queued"] == 150
+        assert sync_device(dev, lambda text: None, outbox)["skipped"] == 300
+
+        # অন্য কেউ log clear করেছে, তারপর ঠিক ততগুলো নতুন punch
+        device.records = make_records(300, today_share=0.5, now=datetime.now() + timedelta(minutes=1))
+        again = sync_device(dev, lambda text: None, outbox)
+        assert again["ok"] and not again["skipped"] and again["fetched"] == 300
+        assert again["queued"] > 0
+    finally:
+        device.close()
+        outbox.close()
+
+
+def test_without_a_tail_read_a_full_fetch_still_comes_every_few_skips(tmp_path):
+    device = FakeDevice(records=make_records(300, today_share=0.5))
+    outbox = Outbox(path=str(tmp_path / "outbox.db"))
+    dev = {"ip": device.host, "port": device.port, "ommit_ping": True}
+    options = {"fast_attlog": False}
+    try:
+        assert sync_device(dev, lambda text: None, outbox, options=options)["ok"]
+        runs = [sync_device(dev, lambda text: None, outbox, options=options) for _ in range(BLIND_SKIPS)]
+        assert [bool(r["skipped"]) for r in runs] == [True] * (BLIND_SKIPS - 1) + [False]
+    finally:
+        device.close()
+        outbox.close()
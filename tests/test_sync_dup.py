@@ -0,0 +1,52 @@
+# tests/test_sync_dup.py
+import json
+from datetime import datetime
+
+import sync_dup
+from sync_dup import SyncDUP
+
+
+def test_replay_skips_a_torn_last_line(tmp_path):
+    dup = SyncDUP(base_dir=str(tmp_path))
+    dup.save_last_sync("SN1", datetime(2026, 10, 18, 9, 30))
+    dup.save_device_state("SN1", {"records": 10})
+    with open(dup.journal_file, "ab") as f:
+        f.write(b'{"k": "state", "sn": "SN1", "v": {"rec')  # লেখার মাঝে crash
+
+    again = SyncDUP(base_dir=str(tmp_path))
+    assert again.get_last_sync("SN1") == datetime(2026, 10, 18, 9, 30)
+    assert again.get_device_state("SN1") == {"records": 10}
+
+    # পরের entry নতুন লাইনে, অর্ধেক লাইনের সাথে জোড়া লাগে না
+    again.save_device_state("SN1", {"records": 11})
+    assert SyncDUP(base_dir=str(tmp_path)).get_device_state("SN1") == {"records": 11}
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_dup, "COMPACT_EVERY", 5)
+    dup = SyncDUP(base_dir=str(tmp_path))
+    for i in range(7):
+        dup.save_device_state(f"SN{i}", {"records": i})
+    dup.save_checkpoint("backfill:SN1", {"position": 3})
+
+    with open(dup.filename, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    assert snapshot["generation"] == 1 and len(snapshot["state"]) == 5
+    assert dup.journal_lines == 3
+
+    again = SyncDUP(base_dir=str(tmp_path))
+    assert {sn: st["records"] for sn, st in again.state.items()} == {f"SN{i}": i for i in range(7)}
+    assert again.get_checkpoint("backfill:SN1") == {"position": 3}
+
+
+def test_writers_sharing_a_folder_keep_each_others_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_dup, "COMPACT_EVERY", 4)
+    gui, daemon = SyncDUP(base_dir=str(tmp_path)), SyncDUP(base_dir=str(tmp_path))
+    for i in range(6):
+        gui.save_device_state(f"GUI{i}", {"records": i})
+        daemon.save_device_state(f"D{i}", {"records": i})  # মাঝে মাঝে অন্যজন compact করে ফেলে
+
+    assert daemon.get_device_state("GUI5") == {"records": 5}
+    final = SyncDUP(base_dir=str(tmp_path))
+    assert len(final.state) == 12
+    assert final.generation == max(gui.generation, daemon.generation)
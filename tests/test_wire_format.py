@@ -0,0 +1,40 @@
+# tests/test_wire_format.py
+from wire_format import MIN_COMPRESS_BYTES, compact_body, decode, encode, endpoint_encoding, expand
+
+PAYLOADS = [
+    {"user_id": "1", "timestamp": "2026-10-18 08:00:00", "status": 1, "device": "10.0.0.1", "device_sn": "SN1"},
+    {"user_id": "2", "timestamp": "2026-10-18 08:01:00", "status": 0, "device": "10.0.0.2", "device_sn": "SN2",
+     "name": "রহিম"},
+    {"user_id": "3", "timestamp": "2026-10-18 08:02:00", "status": 1, "device": "10.0.0.1", "device_sn": "SN1"},
+]
+
+
+def test_compact_body_groups_by_device_and_reports_the_row_order():
+    body, order = compact_body(PAYLOADS)
+    assert body["fields"] == ["user_id", "timestamp", "status", "name"]
+    assert [g["device_sn"] for g in body["groups"]] == ["SN1", "SN2"]
+    assert order == [0, 2, 1]
+
+
+def test_compact_round_trip_through_every_compression():
+    body, order = compact_body(PAYLOADS * 10)
+    for compression in ("none", "gzip", "deflate"):
+        data, headers = encode(body, compression)
+        rows = expand(decode(data, headers.get("Content-Encoding")))
+        expected = [{"name": None, **(PAYLOADS * 10)[i]} for i in order]
+        assert rows == expected
+
+
+def test_small_bodies_are_not_compressed_and_plain_bodies_expand_as_is():
+    data, headers = encode({"records": PAYLOADS[:1]}, "gzip")
+    assert len(data) < MIN_COMPRESS_BYTES and "Content-Encoding" not in headers
+    assert expand(decode(data)) == PAYLOADS[:1]
+
+
+def test_endpoint_encoding_overrides_and_falls_back():
+    options = {"upload_format": "compact", "upload_compression": "gzip",
+               "endpoints": {"https://b/": {"upload_format": "plain"}, "https://c/": {"upload_compression": "br"}}}
+    assert endpoint_encoding("https://a/", options) == ("compact", "gzip")
+    assert endpoint_encoding("https://b/", options) == ("plain", "gzip")
+    assert endpoint_encoding("https://c/", options) == ("compact", "none")
+    assert endpoint_encoding("https://a/") == ("plain", "none")
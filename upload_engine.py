@@ -0,0 +1,145 @@
+# upload_engine.py
+"""
+Concurrent uploads for the outbox drainer (``upload_max_in_flight`` > 1).
+
+``BatchUploader`` sends one request at a time, so every request's latency
+adds up. ``AsyncUploader`` sends the same requests from an asyncio loop:
+up to ``upload_max_in_flight`` requests per endpoint are outstanding at
+once (``endpoints[url]`` may override it). A request waits for its
+rate-limiter token with ``await asyncio.sleep`` while holding its slot,
+so a throttled endpoint (429, ``Retry-After``) holds back every sender
+instead of piling up reservations. requests has no asyncio API, so the
+blocking POST itself runs on a thread pool sized to the in-flight limit.
+
+With ``upload_ordered`` a device's records are sent one request after
+another in outbox order, and a record that needs a retry is retried
+before that device's next request; other devices keep going.
+
+Results are written to the outbox per request as they arrive; outbox
+reads and writes run on the loop's default executor so a slow SQLite
+commit doesn't stall the other requests. The SyncDUP
+watermark still comes from ``Outbox.confirmed_watermark()``, which stops
+at the first record that is not SENT, so a reply that arrives early never
+moves it past a request that is still in flight.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rate_limit import backoff_delay
+from uploader import BatchUploader, OK, RETRY
+
+DEFAULT_MAX_IN_FLIGHT = 1   # opt-in: 1 keeps the synchronous drainer
+
+
+def endpoint_in_flight(url, options=None):
+    """Max outstanding requests for ``url``: ``endpoints[url]`` overrides ``upload_max_in_flight``."""
+    options = options or {}
+    override = (options.get("endpoints") or {}).get(url) or {}
+    value = override.get("upload_max_in_flight", options.get("upload_max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+    return max(1, int(value or 1))
+
+
+class AsyncUploader(BatchUploader):
+    """
+    ``BatchUploader`` whose requests overlap. Build units with ``units()``
+    and await ``deliver()`` for each; ``on_result(tag, ok)`` is still
+    called once for every record. Must be used from a single event loop.
+    """
+
+    def __init__(self, api_url, log_fn, on_result, max_in_flight=DEFAULT_MAX_IN_FLIGHT, ordered=False,
+                 in_flight_for=None, **kwargs):
+        super().__init__(api_url, log_fn, on_result, **kwargs)
+        self.in_flight_for = in_flight_for or (lambda url: max_in_flight)
+        self.ordered = ordered
+        self.slots = {}   # url → asyncio.Semaphore
+        self.lanes = {}   # device_sn → asyncio.Lock (upload_ordered)
+        workers = max(self.in_flight_for(self.api_url), self.in_flight_for(self.batch_url))
+        self.pool = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="upload")
+
+    @property
+    def max_in_flight(self):
+        return self.in_flight_for(self.batch_url if self.batching else self.api_url)
+
+    def units(self, items):
+        """Split ``(payload, tag)`` pairs into requests: batches, or single records, grouped per device when ordered."""
+        size = self.batch_size if self.batching else 1
+        groups = {}
+        for payload, tag in items:
+            key = payload["device_sn"] if self.ordered else None
+            groups.setdefault(key, []).append((payload, tag, 1))
+        return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+    def _throttle(self):
+        # token আগেই _call-এ নেওয়া হয়েছে, শুধু বন্ধ হচ্ছে কিনা দেখি
+        return self.stop_event is None or not self.stop_event.is_set()
+
+    def _slot(self, url):
+        if url not in self.slots:
+            self.slots[url] = asyncio.Semaphore(self.in_flight_for(url))
+        return self.slots[url]
+
+    async def _call(self, url, fn, *args):
+        async with self._slot(url):
+            wait = self.limiter.reserve()
+            if wait > 0:
+                await self._paused(wait)   # stop হলে আগেই ফেরে, _throttle তখন পাঠাতে দেয় না
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def _send_once(self, items):
+        if self.batching:
+            outcomes = await self._call(self.batch_url, self._post_batch, items)
+            if outcomes is not None:
+                return outcomes
+        if self.ordered:
+            # একটার পর একটা, যাতে device-এর ক্রম ঠিক থাকে
+            outcomes = []
+            for payload, _, _ in items:
+                try:
+                    outcomes.append(await self._call(self.api_url, self._post_single, payload))
+                except Exception as e:
+                    outcomes.append(e)
+        else:
+            singles = [self._call(self.api_url, self._post_single, payload) for payload, _, _ in items]
+            outcomes = await asyncio.gather(*singles, return_exceptions=True)
+        for (payload, _, _), outcome in zip(items, outcomes):
+            if isinstance(outcome, Exception):
+                self.log(f"❌ API Failed for User {payload['user_id']}: {outcome}")
+        return [RETRY if isinstance(o, Exception) else o for o in outcomes]
+
+    async def deliver(self, items):
+        """Send one unit, retrying 429/5xx/network failures with backoff until each record has a final outcome."""
+        if not self.ordered:
+            return await self._deliver(items)
+        sn = items[0][0]["device_sn"]
+        if sn not in self.lanes:
+            self.lanes[sn] = asyncio.Lock()
+        async with self.lanes[sn]:
+            return await self._deliver(items)
+
+    async def _deliver(self, items):
+        while items:
+            outcomes = await self._send_once(items)
+            retry = []
+            for (payload, tag, attempt), outcome in zip(items, outcomes):
+                if outcome == RETRY and attempt < self.max_attempts:
+                    retry.append((payload, tag, attempt + 1))
+                    continue
+                if outcome == RETRY:
+                    self.log(f"❌ Giving up on User {payload['user_id']} after {attempt} attempt(s), will retry next sync")
+                self.on_result(tag, outcome == OK)
+            if retry and await self._paused(backoff_delay(retry[0][2] - 1)):
+                return self._give_up([tag for _, tag, _ in retry])
+            items = retry
+
+    async def _paused(self, delay):
+        """``asyncio.sleep(delay)`` that ends early, returning True, once ``stop_event`` is set."""
+        until = time.monotonic() + delay
+        while self.stop_event is None or not self.stop_event.is_set():
+            left = until - time.monotonic()
+            if left <= 0:
+                return False
+            await asyncio.sleep(min(left, 0.5))
+        return True
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,240 @@
+# uploader.py
+import time
+from http_client import get_client
+from rate_limit import (RetryQueue, get_limiter, parse_retry_after,
+                        DEFAULT_RETRY_ATTEMPTS, DEFAULT_RETRY_QUEUE_SIZE)
+from wire_format import PLAIN, COMPACT, compact_body, encode
+
+DEFAULT_BATCH_WINDOW = 2.0  # seconds a partial batch may wait before it is sent
+
+# 📮 Outcome of one upload attempt
+OK, RETRY, FAIL = "ok", "retry", "fail"
+
+# 🚫 Endpoints that answered a batch with "not supported" → single posts from then on
+_no_batch_urls = set()
+# 🚫 Endpoints that rejected compact/compressed bodies (400/415) → plain JSON from then on
+_plain_urls = set()
+
+
+class BatchUploader:
+    """
+    Collects payloads and sends them in chunks.
+
+    Batch body is ``{"records": [...]}`` and the server must answer with
+    ``{"results": [...]}`` holding one entry per record, in order. An entry
+    may be a bool or a dict with ``ok``/``status``/``success``. Anything else
+    (404/405/415/501, or a body without ``results``) marks the endpoint as
+    batch-unaware and the uploader falls back to one POST per record.
+
+    Every request waits on the endpoint's shared RateLimiter. 429s, 5xx and
+    network errors put the record on a bounded RetryQueue with exponential
+    backoff; ``finish()`` drains it.
+
+    ``encoding_for(url)`` returns ``(format, compression)`` for an endpoint
+    (see wire_format); an endpoint that answers 400/415 to a compact or
+    compressed body is downgraded to plain JSON and the request repeated.
+
+    ``on_result(tag, ok)`` is called once for every added record. With
+    ``metrics`` every request's latency, size and status is recorded.
+    """
+
+    def __init__(self, api_url, log_fn, on_result, batch_size=1, batch_window=DEFAULT_BATCH_WINDOW,
+                 batch_url=None, http=None, limiter=None, max_attempts=DEFAULT_RETRY_ATTEMPTS,
+                 retry_queue_size=DEFAULT_RETRY_QUEUE_SIZE, metrics=None, encoding_for=None, stop_event=None):
+        self.api_url = api_url
+        self.http = http or get_client()
+        self.batch_url = batch_url or api_url
+        self.limiter = limiter or get_limiter(api_url)
+        self.log = log_fn
+        self.on_result = on_result
+        self.batch_size = max(1, int(batch_size or 1))
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.retry_queue = RetryQueue(maxsize=retry_queue_size)
+        self.metrics = metrics
+        self.encoding_for = encoding_for or (lambda url: (PLAIN, "none"))
+        self.stop_event = stop_event
+        self.pending = []
+        self.first_queued = None
+
+    @property
+    def batching(self):
+        return self.batch_size > 1 and self.batch_url not in _no_batch_urls
+
+    def add(self, payload, tag):
+        if not self.pending:
+            self.first_queued = time.monotonic()
+        self.pending.append((payload, tag, 1))
+
+        window_over = time.monotonic() - self.first_queued >= self.batch_window
+        if len(self.pending) >= self.batch_size or window_over:
+            self.flush()
+
+    def flush(self):
+        items, self.pending = self.pending, []
+        self._send(items)
+
+    def finish(self):
+        """Flush what is queued, then keep retrying until the retry queue is empty or ``stop_event`` is set."""
+        self.flush()
+        if self.retry_queue:
+            self.log(f"🔁 Retrying {len(self.retry_queue)} log(s)...")
+        while self.retry_queue:
+            if self._stopped(self.retry_queue.wait_time()):
+                self._give_up([tag for _, tag, _ in self.retry_queue.clear()])
+                return
+            self._send(self.retry_queue.pop_due(self.batch_size))
+
+    def _stopped(self, timeout):
+        """Wait ``timeout`` seconds; True when ``stop_event`` is set."""
+        if self.stop_event is None:
+            if timeout > 0:
+                time.sleep(timeout)
+            return False
+        return self.stop_event.wait(max(0.0, timeout))
+
+    def _give_up(self, tags):
+        # 🛑 বন্ধ হচ্ছে: backoff-এর জন্য আর বসে থাকি না, এগুলো outbox-এ pending থেকে পরের sync-এ যায়
+        self.log(f"🛑 Stopping, {len(tags)} log(s) left for the next sync")
+        for tag in tags:
+            self.on_result(tag, False)
+
+    def _send(self, items):
+        if not items:
+            return
+        outcomes = self._post_batch(items) if self.batching else None
+        if outcomes is None:
+            outcomes = [self._post_single(payload) for payload, _, _ in items]
+        for item, outcome in zip(items, outcomes):
+            self._settle(item, outcome)
+
+    def _settle(self, item, outcome):
+        payload, tag, attempt = item
+        if outcome == RETRY:
+            if attempt < self.max_attempts and self.retry_queue.push((payload, tag, attempt + 1), attempt):
+                return
+            self.log(f"❌ Giving up on User {payload['user_id']} after {attempt} attempt(s), will retry next sync")
+        self.on_result(tag, outcome == OK)
+
+    def _throttle(self):
+        """Wait for a rate-limiter token; False (send nothing) once ``stop_event`` is set."""
+        return not self._stopped(self.limiter.reserve())
+
+    def _check_response(self, r, what):
+        """Feed the limiter and classify a non-200 reply."""
+        if r.status_code == 429:
+            retry_after = parse_retry_after(r.headers.get("Retry-After"))
+            self.limiter.on_throttle(retry_after)
+            wait = f"{retry_after:.0f}s" if retry_after else "backoff"
+            self.log(f"⏳ Rate limit hit on {what}, retrying after {wait} (rate {self.limiter.rate:.1f}/s)")
+            return RETRY
+        if r.status_code >= 500:
+            self.limiter.on_server_error()
+            self.log(f"❌ API Error {r.status_code} on {what}, will retry")
+            return RETRY
+        self.log(f"❌ API Error {r.status_code} on {what}: {r.text}")
+        return FAIL
+
+    def encoding(self, url):
+        if url in _plain_urls:
+            return PLAIN, "none"
+        return self.encoding_for(url)
+
+    def _post(self, url, body, records, compression="none"):
+        data, headers = encode(body, compression)
+        started = time.perf_counter()
+        status = None
+        try:
+            r = self.http.post(url, data=data, headers=headers)
+            status = r.status_code
+            return r
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe_upload(time.perf_counter() - started, records, status, len(data))
+
+    def _downgrade(self, url, r, fmt, compression):
+        """True when a 400/415 was caused by our encoding and the endpoint is now plain."""
+        if r.status_code not in (400, 415) or (fmt == PLAIN and compression == "none"):
+            return False
+        self.log(f"↩ Endpoint rejected {fmt}/{compression} body (HTTP {r.status_code}), using plain JSON")
+        _plain_urls.add(url)
+        return True
+
+    # ===== BATCH =====
+    def _post_batch(self, items):
+        """Return a per-record list of outcomes, or None when batching isn't supported."""
+        payloads = [p for p, _, _ in items]
+        fmt, compression = self.encoding(self.batch_url)
+        if fmt == COMPACT:
+            body, order = compact_body(payloads)
+        else:
+            body, order = {"records": payloads}, list(range(len(items)))
+
+        if not self._throttle():
+            return [RETRY] * len(items)
+        try:
+            r = self._post(self.batch_url, body, len(items), compression)
+        except Exception as e:
+            self.log(f"❌ Batch upload failed: {e}")
+            return [RETRY] * len(items)
+
+        if self._downgrade(self.batch_url, r, fmt, compression):
+            return self._post_batch(items)
+
+        if r.status_code in (404, 405, 415, 501):
+            return self._disable_batching(f"HTTP {r.status_code}")
+
+        if r.status_code != 200:
+            return [self._check_response(r, "batch")] * len(items)
+
+        try:
+            results = r.json()["results"]
+        except Exception:
+            return self._disable_batching("no per-record results in response")
+        if not isinstance(results, list) or len(results) != len(items):
+            return self._disable_batching("result count does not match batch")
+
+        self.limiter.on_success()
+        flags = [False] * len(items)
+        for i, res in zip(order, results):  # compact body-তে ক্রম device অনুযায়ী
+            flags[i] = _result_ok(res)
+        self.log(f"📦 Batch of {len(items)}: {sum(flags)} ok, {len(items) - sum(flags)} failed")
+        return [OK if ok else FAIL for ok in flags]
+
+    def _disable_batching(self, reason):
+        self.log(f"↩ Batch upload not supported ({reason}), falling back to single posts")
+        _no_batch_urls.add(self.batch_url)
+        return None
+
+    # ===== SINGLE =====
+    def _post_single(self, payload):
+        _, compression = self.encoding(self.api_url)
+        if not self._throttle():
+            return RETRY
+        try:
+            r = self._post(self.api_url, payload, 1, compression)
+        except Exception as e:
+            self.log(f"❌ API Failed: {e}")
+            return RETRY
+
+        if self._downgrade(self.api_url, r, PLAIN, compression):
+            return self._post_single(payload)
+
+        if r.status_code == 200:
+            self.limiter.on_success()
+            self.log(f"✅ Synced → User {payload['user_id']}")
+            return OK
+        return self._check_response(r, "upload")
+
+
+def _result_ok(res):
+    if isinstance(res, bool):
+        return res
+    if isinstance(res, dict):
+        if "ok" in res:
+            return bool(res["ok"])
+        if "success" in res:
+            return bool(res["success"])
+        return str(res.get("status", "")).lower() in ("ok", "success", "created", "duplicate", "200", "201")
+    return False
+
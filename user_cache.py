@@ -0,0 +1,121 @@
+# user_cache.py
+import json
+import logging
+import os
+import threading
+import time
+from zk.user import User
+from zk_config import state_dir
+
+logger = logging.getLogger("zk_sync")
+
+DEFAULT_USER_FIELDS = ("name", "card", "privilege")
+DEFAULT_MAX_AGE = 24 * 3600   # re-read users at least this often even if the counts match
+STORED_FIELDS = ("uid", "user_id", "name", "privilege", "group_id", "card")
+
+
+def fingerprint(conn):
+    """Cheap change marker from ``read_sizes()``: user, card, finger and face counts."""
+    return f"{conn.users}:{conn.cards}:{conn.fingers}:{getattr(conn, 'faces', 0)}"
+
+
+class UserDirectory:
+    """
+    Per-device copy of the terminal's user list (``users/<sn>.json``).
+
+    ``users_for()`` only calls ``get_users()`` when the device's counts from
+    ``read_sizes()`` differ from the stored fingerprint or the copy is older
+    than ``max_age``; otherwise the cached list is returned with no device
+    round trip. ``lookup()`` is the in-memory map used to add name / card /
+    privilege to upload payloads. Passwords are never stored.
+    """
+
+    def __init__(self, folder=None, max_age=DEFAULT_MAX_AGE):
+        self.folder = folder or os.path.join(state_dir(), "users")
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.devices = {}  # sn → {"fingerprint", "fetched", "users": {user_id: dict}}
+
+    @classmethod
+    def from_options(cls, options):
+        options = options or {}
+        return cls(max_age=options.get("user_cache_max_age", DEFAULT_MAX_AGE))
+
+    def _path(self, sn):
+        return os.path.join(self.folder, f"{sn}.json")
+
+    def _load(self, sn):
+        sn = str(sn)
+        with self.lock:
+            if sn in self.devices:
+                return self.devices[sn]
+        entry = None
+        try:
+            with open(self._path(sn), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = {"fingerprint": data.get("fingerprint"), "fetched": data.get("fetched", 0),
+                     "users": {str(u["user_id"]): u for u in data.get("users", [])}}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load user cache for {sn}: {e}")
+        with self.lock:
+            return self.devices.setdefault(sn, entry)
+
+    def _save(self, sn, entry):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(sn)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": entry["fingerprint"], "fetched": entry["fetched"],
+                       "users": list(entry["users"].values())}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def users_for(self, sn, conn, log):
+        """``zk.user.User`` list for a connected device, from cache when its fingerprint still matches."""
+        fp = fingerprint(conn)
+        entry = self._load(sn)
+        if entry and entry["fingerprint"] == fp and time.time() - entry["fetched"] < self.max_age:
+            return [User(u["uid"], u["name"], u["privilege"], group_id=u["group_id"],
+                         user_id=u["user_id"], card=u["card"]) for u in entry["users"].values()]
+
+        users = conn.get_users()
+        fresh = {str(u.user_id): {f: getattr(u, f) for f in STORED_FIELDS} for u in users}
+        old = entry["users"] if entry else {}
+        added = len(fresh.keys() - old.keys())
+        removed = len(old.keys() - fresh.keys())
+        changed = sum(1 for k in fresh.keys() & old.keys() if fresh[k] != old[k])
+        entry = {"fingerprint": fp, "fetched": time.time(), "users": fresh}
+        if added or removed or changed or not old:
+            log(f"👥 User list updated: {len(fresh)} user(s), +{added} -{removed} ~{changed}")
+        self._save(sn, entry)
+        with self.lock:
+            self.devices[str(sn)] = entry
+        return users
+
+    def lookup(self, sn, user_id):
+        entry = self._load(sn)
+        return entry["users"].get(str(user_id)) if entry else None
+
+
+def enrich(payload, directory, fields=DEFAULT_USER_FIELDS):
+    """Add ``fields`` of the punching user to an upload payload (in place) when the directory knows them."""
+    if not fields:
+        return payload
+    user = directory.lookup(payload["device_sn"], payload["user_id"])
+    if user:
+        for f in fields:
+            payload[f] = user.get(f)
+    return payload
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_user_directory(options=None):
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = UserDirectory.from_options(options)
+        return _directory
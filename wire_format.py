@@ -0,0 +1,87 @@
+# wire_format.py
+"""
+Upload body encodings.
+
+plain:    {"records": [{"user_id", "timestamp", "status", "device", "device_sn"}, ...]}
+compact:  {"format": "compact", "fields": ["user_id", "timestamp", "status"],
+           "groups": [{"device": ..., "device_sn": ..., "rows": [[uid, ts, status], ...]}, ...]}
+
+Payload keys beyond these (e.g. the user's ``name``, ``card``,
+``privilege``) are appended to ``fields`` in compact bodies.
+
+A compact reply is the same ``{"results": [...]}`` list, one entry per
+row in body order (group by group). Either body may be sent gzip or
+deflate compressed with a matching ``Content-Encoding`` header.
+"""
+import gzip
+import json
+import zlib
+
+PLAIN, COMPACT = "plain", "compact"
+COMPRESSIONS = ("none", "gzip", "deflate")
+MIN_COMPRESS_BYTES = 512  # ছোট body compress করলে লাভ নেই
+COMPACT_FIELDS = ("user_id", "timestamp", "status")
+GROUP_FIELDS = ("device", "device_sn")
+
+
+def endpoint_encoding(url, options=None):
+    """``(format, compression)`` for ``url``: ``endpoints[url]`` overrides the global upload_* keys."""
+    options = options or {}
+    override = (options.get("endpoints") or {}).get(url) or {}
+    fmt = override.get("upload_format", options.get("upload_format", PLAIN))
+    compression = override.get("upload_compression", options.get("upload_compression", "none")) or "none"
+    if fmt not in (PLAIN, COMPACT):
+        fmt = PLAIN
+    if compression not in COMPRESSIONS:
+        compression = "none"
+    return fmt, compression
+
+
+def compact_body(payloads):
+    """Return ``(body, order)``; ``order[i]`` is the index in ``payloads`` of the i-th row sent."""
+    groups = {}
+    for i, p in enumerate(payloads):
+        key = tuple(p.get(f) for f in GROUP_FIELDS)
+        groups.setdefault(key, []).append(i)
+    fields = list(COMPACT_FIELDS)
+    for p in payloads:
+        fields.extend(f for f in p if f not in fields and f not in GROUP_FIELDS)
+    body = {"format": COMPACT, "fields": fields, "groups": []}
+    order = []
+    for key, indexes in groups.items():
+        group = dict(zip(GROUP_FIELDS, key))
+        group["rows"] = [[payloads[i].get(f) for f in fields] for i in indexes]
+        body["groups"].append(group)
+        order.extend(indexes)
+    return body, order
+
+
+def encode(obj, compression="none"):
+    """Serialize to ``(data, headers)``: JSON without spaces, compressed when worth it."""
+    data = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compression != "none" and len(data) >= MIN_COMPRESS_BYTES:
+        if compression == "gzip":
+            data = gzip.compress(data, compresslevel=6)
+        else:
+            data = zlib.compress(data, 6)
+        headers["Content-Encoding"] = compression
+    return data, headers
+
+
+def decode(data, content_encoding=None):
+    """Inverse of ``encode`` (used by the local fake API)."""
+    if content_encoding == "gzip":
+        data = gzip.decompress(data)
+    elif content_encoding == "deflate":
+        data = zlib.decompress(data)
+    return json.loads(data or b"{}")
+
+
+def expand(body):
+    """Plain record list from either body format."""
+    if body.get("format") != COMPACT:
+        return body.get("records", [])
+    fields = body.get("fields", COMPACT_FIELDS)
+    return [{**{f: g.get(f) for f in GROUP_FIELDS}, **dict(zip(fields, row))}
+            for g in body.get("groups", []) for row in g.get("rows", [])]
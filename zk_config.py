@@ -0,0 +1,72 @@
+# zk_config.py
+import ctypes
+import json
+import os
+import re
+import sys
+
+# ===== PATHS SAFE =====
+if os.environ.get("ZKSYNC_HOME"):
+    # server / benchmark run: data dir চাইলে বাইরে থেকে দেওয়া যায়
+    BASE_DIR = os.environ["ZKSYNC_HOME"]
+elif getattr(sys, "frozen", False):
+    # BASE_DIR = os.path.dirname(os.path.realpath(sys.executable))
+    BASE_DIR = os.path.join(os.path.expanduser("~"), ".zkteco_sync")
+else:
+    # BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+os.makedirs(BASE_DIR, exist_ok=True)
+# CONFIG_FILE = os.path.join(BASE_DIR, ".zkdata")
+CONFIG_FILE = os.path.join(BASE_DIR, ".zkdata")
+
+FIXED_API_URL = "https://payrool.nitbd.com/api/iclock/cdata"
+
+# outbox / sync state / metrics-এর folder; sharded daemon-এ প্রতিটি worker-এর আলাদা
+_state_dir = BASE_DIR
+
+
+def state_dir():
+    return _state_dir
+
+
+def set_state_dir(path):
+    """Keep outbox, sync state and metrics files in ``path``; call before importing zk_sync."""
+    global _state_dir
+    os.makedirs(path, exist_ok=True)
+    _state_dir = path
+
+
+def worker_state_dir(worker_id):
+    """State folder of one shard worker, under BASE_DIR/workers."""
+    return os.path.join(BASE_DIR, "workers", re.sub(r"[^A-Za-z0-9_.-]", "_", worker_id))
+
+
+# ===== CONFIG HANDLING =====
+# (GUI ছাড়া, যাতে CLI/daemon tkinter import না করেই config পড়তে পারে)
+def default_config():
+    return {"devices": [], "auto_sync_interval": 0}
+
+
+def read_config():
+    if not os.path.exists(CONFIG_FILE):
+        return default_config()
+
+    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def hide_file(path):
+    try:
+        FILE_ATTRIBUTE_HIDDEN = 0x02
+        ctypes.windll.kernel32.SetFileAttributesW(path, FILE_ATTRIBUTE_HIDDEN)
+    except:
+        pass
+
+
+def write_config(cfg):
+    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=4)
+
+    # hide file after save (Windows)
+    if os.name == "nt":
+        hide_file(CONFIG_FILE)
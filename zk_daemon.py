@@ -0,0 +1,203 @@
+# zk_daemon.py
+"""
+Headless sync for servers with no display (cron / systemd).
+
+    python zk_daemon.py --once              # one cycle, exit code tells how it went
+    python zk_daemon.py --interval 3600     # per-device schedule until SIGTERM/SIGINT
+    python zk_daemon.py --json-logs         # one JSON object per log line
+    python zk_daemon.py --metrics-port 9105 # last cycle at /metrics (Prometheus) and /stats (JSON)
+    python zk_daemon.py --live              # stream punches in real time (or "live_mode": true)
+    python zk_daemon.py --shard --worker-id a   # share the fleet with other --shard workers
+
+Reads the same .zkdata as the GUI and never imports tkinter. The first
+SIGTERM/SIGINT stops new device connections and uploads after the
+current chunk; devices already connected are re-enabled before exit.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+
+EXIT_OK = 0
+EXIT_DEVICE_ERRORS = 1   # cycle ran, but at least one device failed
+EXIT_CONFIG = 2          # no devices / unreadable config
+EXIT_INTERRUPTED = 130   # stopped by a signal in --once mode
+
+_DEVICE_TAG = re.compile(r"^\[([^\]]+)\] ")
+
+log = logging.getLogger("zk_sync")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        msg = record.getMessage()
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+        }
+        m = _DEVICE_TAG.match(msg)
+        if m:
+            entry["device"] = m.group(1)
+            msg = msg[m.end():]
+        entry["msg"] = msg
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(json_logs=False, log_file=None):
+    handler = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_logs else logging.Formatter("%(asctime)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+def log_line(text):
+    # ❌/⚠️ লাইনগুলো level দিয়ে আলাদা করা যায়
+    if "❌" in text:
+        log.error(text)
+    elif "⚠️" in text:
+        log.warning(text)
+    else:
+        log.info(text)
+
+
+def install_signal_handlers(stop_event):
+    def handler(signum, frame):
+        if stop_event.is_set():
+            log.error("🛑 Second signal, exiting immediately (devices may stay disabled)")
+            os._exit(EXIT_INTERRUPTED)
+        log.warning(f"🛑 Signal {signum} received, finishing current work...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handler)
+
+
+def run_cycle(cfg, api_url, http, stop_event, shard=None):
+    # ভারী import শুধু sync-এর সময়, --help/arg error সাথে সাথে
+    from zk_sync import fetch_logs_and_sync, device_key, DEFAULT_WORKERS
+
+    devices = cfg["devices"]
+    if shard:
+        gap = (cfg.get("auto_sync_interval") or 0) / 2
+        devices = [dev for dev in shard.owned(devices) if shard.claim(dev, gap)]
+        log.info(f"🧩 {len(devices)} of {len(cfg['devices'])} device(s) claimed by {shard.worker_id}")
+    summaries = fetch_logs_and_sync(api_url, devices, log_line,
+                                    workers=cfg.get("sync_workers", DEFAULT_WORKERS),
+                                    options=cfg, http=http, stop_event=stop_event)
+    if shard:
+        # 🔑 summary-র ক্রম device list-এর মতো নাও হতে পারে (stop হলে কিছু বাদও যায়)
+        by_key = {s["device"]: s for s in summaries}
+        for dev in devices:
+            s = by_key.get(device_key(dev), {})
+            shard.release(dev, s.get("ok", False), s.get("sn"))
+    return all(s["ok"] for s in summaries)
+
+
+def start_shard(cfg, worker_id):
+    """Join the shard ring with this worker's own state folder; None if the id is taken."""
+    import socket
+    from zk_config import set_state_dir, worker_state_dir
+
+    worker_id = worker_id or cfg.get("shard_worker_id") or socket.gethostname()
+    set_state_dir(worker_state_dir(worker_id))  # 📁 outbox / last_sync worker-প্রতি আলাদা, zk_sync import-এর আগে
+    from shard import ShardCoordinator
+    shard = ShardCoordinator.from_options(cfg, log_line, worker_id)
+    try:
+        shard.register()
+    except ValueError as e:
+        log.error(f"❌ {e}, pass a different --worker-id")
+        return None
+    shard.start()
+    log.info(f"🧩 Shard worker {worker_id} joined ({shard.path})")
+    return shard
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless ZKTeco attendance sync")
+    parser.add_argument("--once", action="store_true", help="run one sync cycle and exit")
+    parser.add_argument("--interval", type=int, help="seconds between cycles (default: auto_sync_interval or 3600)")
+    parser.add_argument("--api-url", help="override the upload endpoint")
+    parser.add_argument("--json-logs", action="store_true", help="emit one JSON object per log line")
+    parser.add_argument("--log-file", help="write logs here instead of stdout")
+    parser.add_argument("--metrics-port", type=int, help="serve the last cycle's metrics on this port")
+    parser.add_argument("--live", action="store_true", help="real-time mode: stream punches from every device")
+    parser.add_argument("--shard", action="store_true", help="sync only this worker's share of the devices")
+    parser.add_argument("--worker-id", help="shard worker name (default: shard_worker_id or host name)")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.json_logs, args.log_file)
+
+    from zk_config import CONFIG_FILE, FIXED_API_URL, read_config
+    try:
+        cfg = read_config()
+    except Exception as e:
+        log.error(f"❌ Cannot read config {CONFIG_FILE}: {e}")
+        return EXIT_CONFIG
+    if not cfg.get("devices"):
+        log.error(f"❌ No devices in {CONFIG_FILE}")
+        return EXIT_CONFIG
+
+    api_url = args.api_url or FIXED_API_URL
+    interval = args.interval or cfg.get("auto_sync_interval") or 3600
+
+    stop_event = threading.Event()
+    install_signal_handlers(stop_event)
+
+    shard = None
+    if args.shard or args.worker_id or cfg.get("shard_mode"):
+        shard = start_shard(cfg, args.worker_id)
+        if shard is None:
+            return EXIT_CONFIG
+
+    if args.metrics_port:
+        from metrics import serve_metrics
+        serve_metrics(args.metrics_port)
+        log.info(f"📊 Metrics on http://0.0.0.0:{args.metrics_port}/metrics")
+
+    from http_client import HttpClient
+    http = HttpClient.from_options(cfg)  # 🔗 সব cycle এই session reuse করবে
+
+    if not args.once and (args.live or cfg.get("live_mode")):
+        from live import run_live
+        # live mode-এ ডিভাইস শুরুতেই ভাগ হয়, চলার মাঝে rebalance হয় না
+        devices = shard.owned(cfg["devices"]) if shard else cfg["devices"]
+        run_live(api_url, devices, log_line, options=cfg, http=http, stop_event=stop_event)
+        if shard:
+            shard.stop()
+        log.info("👋 Stopped")
+        return EXIT_OK
+
+    if args.once:
+        ok = run_cycle(cfg, api_url, http, stop_event, shard)
+        if shard:
+            shard.stop()
+        if stop_event.is_set():
+            return EXIT_INTERRUPTED
+        return EXIT_OK if ok else EXIT_DEVICE_ERRORS
+
+    from scheduler import DeviceScheduler
+
+    def get_config():
+        cfg = read_config()  # GUI থেকে device যোগ/বাদ হলে পরের wake-up-এ ধরা পড়ে
+        cfg["auto_sync_interval"] = args.interval or cfg.get("auto_sync_interval") or 3600
+        return cfg
+
+    log.info(f"⏰ Syncing every {interval}s per device (jittered), Ctrl+C / SIGTERM to stop")
+    scheduler = DeviceScheduler(api_url, get_config, log_line, http=http, stop_event=stop_event, shard=shard)
+    scheduler.start()
+    while scheduler.is_alive():
+        scheduler.join(1)  # main thread জেগে থাকে যাতে signal handler চলে
+    if shard:
+        shard.stop()
+
+    log.info("👋 Stopped")
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,106 +1,455 @@
 from zk import ZK
-import requests
 from datetime import datetime, date
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from sync_dup import SyncDUP
+from http_client import get_client
+from outbox import Outbox, OutboxDrainer, TS_FORMAT, DEFAULT_KEEP_DAYS, format_ts
+from metrics import CycleMetrics, export_paths
+from health import get_health
+from user_cache import get_user_directory
+from attlog import AttLog
+from rawlog import read_attlog, read_last_time
+from retention import retention_settings, archive_logs, prune_blocker
 
 dup = SyncDUP()
 
-def fetch_logs_and_sync(api_url, devices, log_fn):
+DEFAULT_WORKERS = 4  # একসাথে কয়টা ডিভাইস থেকে fetch হবে
+ATT_RECORD_SIZE = 40  # bytes per attendance record on current (TCP) firmware, for estimates
+BLIND_SKIPS = 12      # unchanged-count skips without a last-record check before a full fetch anyway
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(options=None):
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(keep_days=(options or {}).get("outbox_keep_days", DEFAULT_KEEP_DAYS))
+        return _outbox
+
+
+_device_locks = {}
+_device_locks_lock = threading.Lock()
+
+
+def device_key(dev):
+    # একই IP-তে আলাদা port মানে আলাদা terminal (NAT / port forward)
+    ip, port = dev.get("ip"), dev.get("port", 4370)
+    return ip if port == 4370 else f"{ip}:{port}"
+
+
+def device_lock(key):
+    # 🔒 একটা terminal-এ একসাথে একটাই connection (daily sync বনাম backfill)
+    with _device_locks_lock:
+        return _device_locks.setdefault(key, threading.Lock())
+
+
+_live_keys = set()  # live mode-এর thread যেসব ডিভাইস নিজেই চালায়
+
+
+def set_live(key, on):
+    """Mark ``key`` as run by a live-mode thread; scheduled and manual syncs skip it meanwhile."""
+    with _device_locks_lock:
+        if on:
+            _live_keys.add(key)
+        else:
+            _live_keys.discard(key)
+
+
+def is_live(key):
+    with _device_locks_lock:
+        return key in _live_keys
+
+
+def same_tail(logs, start, base, tail):
+    """True when device record ``base - 1`` is in ``logs`` (which starts at ``start``) with time code ``tail``."""
+    i = base - 1 - start
+    return 0 <= i < len(logs) and logs.ts[i] == tail
+
+
+def log_replaced(conn, records, prev, options=None):
+    """
+    Whether a log with the same record count as last time is a different
+    log (cleared and refilled): its last record, read on its own (~40
+    bytes), is compared with the stored ``tail``. None when that can't
+    be told without a full read.
+    """
+    if not (options or {}).get("fast_attlog", True) or prev.get("tail") is None:
+        return None
+    last = read_last_time(conn, records)
+    return None if last is None else last != prev["tail"]
+
+
+def sync_device(dev, log_fn, outbox, today=None, drainer=None, stop_event=None, metrics=None, options=None):
+    """
+    Run one device's connect/fetch/release cycle.
+
+    The terminal is disabled only while its attendance buffer is read and
+    is re-enabled and disconnected before anything else happens; filtering
+    and the outbox commit run from memory afterwards, and uploading is the
+    drainer's job. The device keeps its records, so a crash before the
+    commit just means they are read again next time (device state is only
+    saved after the commit).
+
+    Returns a summary dict used for the end-of-cycle report; per-phase
+    timings go to ``metrics``.
+    """
+    ip = dev.get("ip")
+    pwd = dev.get("password", 0)
+    port = dev.get("port", 4370)
+    key = device_key(dev)
+    today = today or date.today()  # আজকের তারিখ
+    metrics = metrics or CycleMetrics()
 
     def log(text):
-        log_fn(text)
+        log_fn(f"[{ip}] {text}")
 
-    log("🔄 Starting sync with devices...")
+    summary = {"ip": ip, "device": key, "sn": None, "fetched": 0, "skipped": 0, "bytes": 0,
+               "queued": 0, "sent": 0, "locked": 0.0, "cleared": 0, "ok": False, "error": None}
+    keep_days = retention_settings(dev, options)
+    started = time.monotonic()
 
-    today = date.today()  # আজকের তারিখ
+    # 🛑 shutdown চাওয়া হলে নতুন ডিভাইসে আর connect করি না
+    if stop_event is not None and stop_event.is_set():
+        summary["error"] = "stopped before start"
+        summary["elapsed"] = 0.0
+        return summary
 
-    for dev in devices:
-        ip = dev.get("ip")
-        pwd = dev.get("password", 0)
-        port = dev.get("port", 4370)
+    conn = None
+    locked_at = None
 
-        conn = None
+    def release():
+        # 🔓 enable + disconnect, যত তাড়াতাড়ি সম্ভব; দ্বিতীয়বার ডাকলে কিছু করে না
+        nonlocal conn, locked_at
+        if not conn:
+            return
         try:
-            log(f"🔌 Connecting to {ip}:{port}")
-            zk = ZK(ip, port=port, timeout=5, password=pwd)
+            with metrics.phase(key, "enable"):
+                if locked_at is not None:
+                    conn.enable_device()
+                conn.disconnect()
+            if locked_at is not None:
+                log(f"🔓 Device re-enabled after {time.monotonic() - locked_at:.1f}s, disconnected {ip}")
+            else:
+                log(f"🔌 Disconnected {ip}")
+        except Exception as e:
+            log(f"⚠️ Failed to enable/disconnect: {e}")
+        finally:
+            if locked_at is not None:
+                summary["locked"] = time.monotonic() - locked_at
+            conn, locked_at = None, None
+
+    def clear_log(sn, state, records):
+        # 🗑 verify-then-clear: সব archive + confirmed হলে, disable অবস্থায় count মিলিয়ে তবেই clear
+        nonlocal locked_at
+        blocker = prune_blocker(state, records, outbox.unconfirmed_count(sn), keep_days)
+        if blocker:
+            log(f"🗄 Device log kept: {blocker}")
+            return
+        with metrics.phase(key, "disable"):
+            conn.disable_device()
+            locked_at = time.monotonic()
+        with metrics.phase(key, "clear"):
+            conn.read_sizes()
+            if conn.records != records:
+                log(f"⚠️ Log changed while verifying ({records} → {conn.records}), not cleared")
+                return
+            conn.clear_attendance()
+            conn.read_sizes()
+            if conn.records:
+                raise RuntimeError(f"device still reports {conn.records} record(s) after clear")
+        release()
+        dup.save_device_state(sn, {**state, "records": 0, "tail": None, "archived": 0, "queued": 0, "oldest": None, "newest": None,
+                                   "cleared": datetime.now().isoformat(timespec="seconds")})
+        summary["cleared"] = records
+        log(f"🗑 Device log cleared, {records} record(s) kept in archive/{sn}.csv")
+
+    lock = device_lock(key)
+    lock.acquire()
+    try:
+        log(f"🔌 Connecting to {ip}:{port}")
+        zk = ZK(ip, port=port, timeout=5, password=pwd, ommit_ping=dev.get("ommit_ping", False))
+        with metrics.phase(key, "connect"):
             conn = zk.connect()
+
+        sn = conn.get_serialnumber()
+        summary["sn"] = sn
+        log(f"📟 Device SN: {sn}")
+
+        # আগের আজকের সিঙ্ক সময় (শুধু outbox-এর আগের version থেকে আসা ডিভাইসের জন্য দরকার)
+        last_sync = dup.get_last_sync(sn)
+        if not isinstance(last_sync, datetime) or (last_sync and last_sync.date() != today):
+            last_sync = None  # আগের দিনের বা invalid last_sync ignore
+
+        # 📏 সস্তা check: ডিভাইসে record count আগের মতই থাকলে পুরো log নামানোর দরকার নেই
+        with metrics.phase(key, "read_sizes"):
+            conn.read_sizes()
+        records, rec_cap = conn.records, conn.rec_cap
+        prev = dup.get_device_state(sn) or {}
+        prev_records = prev.get("records")
+        full = rec_cap and records >= rec_cap  # ভরা log-এ পুরনো record overwrite হয়, count কিছু বলে না
+
+        if prev_records == records and not full:
+            # 🔎 count এক হলেও clear হয়ে আবার একই সংখ্যায় ভরে যেতে পারে: শেষ record-টা মিলিয়ে দেখি
+            replaced = log_replaced(conn, records, prev, options)
+            blind = prev.get("blind_skips", 0) + 1 if replaced is None else 0
+            if replaced:
+                log(f"🧹 Last record changed at the same count ({records}), checking all logs")
+                prev, prev_records = {}, None
+            elif blind < BLIND_SKIPS:
+                summary["skipped"] = records
+                summary["ok"] = True
+                log(f"⏭ No new logs on device ({records} stored), skipped download (~{records * ATT_RECORD_SIZE // 1024} KB)")
+                if blind:
+                    dup.save_device_state(sn, {**prev, "blind_skips": blind})
+                if keep_days is not None and records:
+                    clear_log(sn, prev, records)
+                return summary
+
+        # 👥 user list cache থেকে, count বদলালে তবেই ডিভাইস থেকে পড়ি (disable-এর আগে)
+        with metrics.phase(key, "users"):
+            users = get_user_directory().users_for(sn, conn, log)
+        conn.get_users = lambda: users  # get_attendance ভেতরে আবার পুরো user list না নামায়
+
+        # ✂️ log append-only: আগের count জানা থাকলে ডিভাইস থেকে শুধু পরের অংশটুকু, তবে
+        # আগের শেষ record-টা (base-1) সহ পড়ি, সেটা না মিললে মাঝে log clear হয়েছে
+        tail = prev.get("tail")
+        base = prev_records if tail is not None and not full and 0 < (prev_records or 0) < records else 0
+        skip = base - 1 if base else 0
+        if keep_days is not None:
+            # archive-এ না ওঠা বা upload-এ না যাওয়া অংশও পড়তে হবে
+            skip = min(skip, prev.get("archived") or 0, prev.get("queued") or 0)
+
+        # 🔒 শুধু log পড়ার সময়টুকু ডিভাইস disable, তারপরই ছেড়ে দেই
+        with metrics.phase(key, "disable"):
             conn.disable_device()
+            locked_at = time.monotonic()
+        try:
+            with metrics.phase(key, "get_attendance"):
+                if (options or {}).get("fast_attlog", True):
+                    logs, total, start = read_attlog(conn, users, skip)
+                else:
+                    logs = AttLog.from_attendance(conn.get_attendance())
+                    total, start = len(logs), 0
+                if base and not same_tail(logs, start, base, tail):
+                    log(f"🧹 Device log was replaced since last fetch (record {base} changed), checking all logs")
+                    base, prev = 0, {}
+                    if start:
+                        logs, total, start = read_attlog(conn, users)
+                elif total == prev_records and tail is not None and len(logs) and logs.ts[-1] != tail:
+                    log("🧹 Device log was replaced since last fetch (same count, last record changed)")
+                    prev = {}
+        finally:
+            release()
+        summary["fetched"] = len(logs)
+        summary["bytes"] = len(logs) * ATT_RECORD_SIZE
+        log(f"✔ {len(logs)} log(s) fetched from {ip} (~{summary['bytes'] // 1024} KB)")
 
-            sn = conn.get_serialnumber()
-            log(f"📟 Device SN: {sn}")
+        state = {"records": total, "rec_cap": rec_cap, "tail": logs.ts[-1] if len(logs) else None}
+        backlog = []
+        if keep_days is not None:
+            # 🗄 clear-এর আগে প্রতিটি record local archive-এ
+            archived = prev.get("archived") or 0
+            queued_upto = prev.get("queued") or 0
+            if full and prev.get("newest"):
+                fresh = unqueued = logs.since(datetime.fromisoformat(prev["newest"]))  # ভরা log-এ index কাজ করে না
+            else:
+                fresh = logs[archived - start:] if start <= archived <= total else logs
+                unqueued = logs[queued_upto - start:] if start <= queued_upto <= total else logs
+            archive_logs(sn, fresh)
+            # 📤 clear হলে আর backfill করা যাবে না, তাই আগের দিনগুলোর যা API পায়নি সেগুলোও outbox-এ যায়
+            backlog = [l for l in unqueued if l.timestamp.date() != today]
+            legacy = dup.get_last_sync(sn)
+            if legacy and backlog:
+                # ledger শুরুর আগের ইতিহাস: পুরনো daily sync watermark পর্যন্ত পাঠিয়েছে ধরে নেই
+                cutoff = min(legacy, datetime.fromisoformat(outbox.ledger_since))
+                backlog = [l for l in backlog if l.timestamp > cutoff]
+            oldest, newest = logs.oldest(), logs.newest()
+            if start and prev.get("oldest"):
+                oldest = datetime.fromisoformat(prev["oldest"])  # মাথার অংশ এবার পড়া হয়নি
+            state.update(archived=total, queued=total,
+                         oldest=oldest and oldest.isoformat(sep=" "),
+                         newest=newest and newest.isoformat(sep=" "))
 
-            # আগের আজকের সিঙ্ক সময়
-            last_sync = dup.get_last_sync(sn)
-            if not isinstance(last_sync, datetime) or (last_sync and last_sync.date() != today):
-                last_sync = None  # আগের দিনের বা invalid last_sync ignore
+        if base:
+            summary["skipped"] = base
+            logs = logs[base - start:]
+            stayed = f", {start} older ones stayed on the device" if start else ""
+            log(f"✂️ Only the last {len(logs)} log(s) are new since last fetch{stayed}")
+        elif prev_records is not None and total < prev_records:
+            log(f"🧹 Device log shrank ({prev_records} → {total}), checking all logs")
 
-            if last_sync:
-                log(f"🧠 Last sync time today: {last_sync}")
+        # 🔎 আজকের যে লগ আগে কখনো দেখা হয়নি (ক্রম যাই হোক, দেরিতে আসা punch-ও ধরা পড়ে)
+        with metrics.phase(key, "filter"):
+            # আজকের অংশটুকু binary search-এ, object শুধু সেগুলোর জন্য
+            today_logs = logs.records(logs.days(today))
+            if last_sync and not outbox.has_rows(sn):
+                # ⬆️ আগের version watermark পর্যন্ত পাঠিয়ে দিয়েছে, সেগুলো sent হিসেবে outbox-এ
+                sent = [(str(l.user_id), format_ts(l.timestamp), l.status) for l in today_logs
+                        if l.timestamp <= last_sync]
+                if outbox.adopt(sn, sent):
+                    log(f"🧠 {len(sent)} log(s) up to last sync {last_sync} were already sent, not sending again")
+            new_logs = [l for l in today_logs if not outbox.seen(sn, l)]
+            new_logs += outbox.unsent(sn, backlog)
 
-            logs = conn.get_attendance()
-            log(f"✔ {len(logs)} log(s) fetched from {ip}")
+        # 📥 disk-এ commit; upload করবে drainer
+        with metrics.phase(key, "outbox"):
+            queued = outbox.add(sn, ip, new_logs)
+        summary["queued"] = queued
+        summary["ok"] = True
+        log(f"📥 {queued} new log(s) saved to outbox")
+        if drainer:
+            drainer.notify()
 
-            max_synced_time = last_sync
-            sent_count = 0
+        # 💾 outbox-এ commit হওয়ার পরেই count মনে রাখি
+        state["checked"] = datetime.now().isoformat(timespec="seconds")
+        dup.save_device_state(sn, state)
 
-            for l in logs:
-                # ⛔ Skip logs not from today
-                if l.timestamp.date() != today:
-                    continue
+        if keep_days is not None and full and not queued and prev_records == total:
+            # ভরা ডিভাইস কখনো skip হয় না, তাই নতুন কিছু না থাকলে এখানেই clear
+            conn = zk.connect()
+            clear_log(sn, state, total)
 
-                # ⛔ Skip logs already synced today
-                if last_sync and l.timestamp <= last_sync:
-                    continue
+    except Exception as e:
+        summary["error"] = str(e)
+        log(f"❌ Connection/Fetch failed for {ip}: {e}")
 
-                payload = {
-                    "user_id": l.user_id,
-                    "timestamp": l.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                    "status": l.status,
-                    "device": ip,
-                    "device_sn": sn
-                }
+    finally:
+        release()
+        lock.release()
+        summary["elapsed"] = time.monotonic() - started
+        get_health().record(key, summary["ok"], summary["error"])
+        metrics.set_device(key, **{k: summary[k] for k in ("sn", "fetched", "skipped", "bytes", "queued",
+                                                         "locked", "ok", "error", "elapsed")})
 
-                try:
-                    r = requests.post(api_url, json=payload, timeout=10)
+    return summary
 
-                    if r.status_code == 200:
-                        log(f"✅ Synced → User {l.user_id}")
-                        sent_count += 1
 
-                        if not max_synced_time or l.timestamp > max_synced_time:
-                            max_synced_time = l.timestamp
+def fetch_logs_and_sync(api_url, devices, log_fn, workers=DEFAULT_WORKERS, options=None, http=None,
+                        stop_event=None):
 
-                    elif r.status_code == 429:
-                        log("⏳ Rate limit hit, waiting 2s...")
-                        time.sleep(2)
-                        continue
+    def log(text):
+        log_fn(text)
 
-                    else:
-                        log(f"❌ API Error {r.status_code}: {r.text}")
+    log("🔄 Starting sync with devices...")
 
-                except Exception as e:
-                    log(f"❌ API Failed: {e}")
+    today = date.today()
+    http = http or get_client(options)  # 🔗 একটাই keep-alive session সব ডিভাইসের জন্য
+    outbox = get_outbox(options)
+    started = time.monotonic()
+    metrics = CycleMetrics()
 
-                time.sleep(0.4)  # 🔹 delay to avoid 429
+    backlog = outbox.pending_count()
+    if backlog:
+        log(f"📤 {backlog} log(s) left in outbox from earlier runs")
 
-            # 💾 Save last sync ONLY if something sent
-            if sent_count > 0 and max_synced_time:
-                dup.save_last_sync(sn, max_synced_time)
-                log(f"💾 Last sync updated → {max_synced_time}")
+    all_devices = devices
+    # 📡 live capture-এ থাকা ডিভাইস live thread নিজেই poll করে, এখানে connect করলে session-এ ধাক্কা লাগে
+    live = [dev for dev in devices if is_live(device_key(dev))]
+    if live:
+        log(f"📡 {len(live)} device(s) in live capture, skipped: {', '.join(device_key(dev) for dev in live)}")
+        devices = [dev for dev in devices if not is_live(device_key(dev))]
 
-            log(f"📊 Sent {sent_count} new log(s) from {ip}")
+    # 📡 আগে সবার TCP port একসাথে দেখি; মৃত ডিভাইসে পুরো connect timeout নষ্ট হয় না
+    devices, offline = get_health(options).screen(devices, device_key, log)
+    for dev, reason in offline:
+        log(f"[{dev.get('ip')}] 📴 {reason}")
+        metrics.set_device(device_key(dev), sn=dev.get("sn"), ok=False, error=reason)
+    # probe-এ TCP পাওয়া গেছে, pyzk-এর আলাদা ICMP ping লাগবে না
+    devices = [{**dev, "ommit_ping": True} for dev in devices]
+    workers = max(1, min(int(workers or 1), len(devices) or 1))
 
-        except Exception as e:
-            log(f"❌ Connection/Fetch failed for {ip}: {e}")
+    # 📤 fetch চলাকালীনই upload শুরু, দুই পাশ নিজের গতিতে চলে
+    drainer = OutboxDrainer(api_url, outbox, log_fn, options, http, stop_event=stop_event, metrics=metrics)
+    drainer.start()
+    try:
+        if workers == 1:
+            summaries = [sync_device(dev, log_fn, outbox, today, drainer, stop_event, metrics, options)
+                         for dev in devices]
+        else:
+            # 🧵 প্রতিটা ডিভাইস আলাদা thread-এ, একজনের timeout অন্যজনকে আটকায় না
+            log(f"🧵 Syncing {len(devices)} device(s) with {workers} worker(s)")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zk-sync") as pool:
+                summaries = list(pool.map(
+                    lambda dev: sync_device(dev, log_fn, outbox, today, drainer, stop_event, metrics, options), devices))
+    finally:
+        drainer.finish()
 
-        finally:
-            if conn:
-                try:
-                    conn.enable_device()
-                    conn.disconnect()
-                    log(f"🔌 Disconnected {ip}")
-                except Exception as e:
-                    log(f"⚠️ Failed to enable/disconnect: {e}")
+    # 📋 মূল ক্রমে, offline ডিভাইসসহ
+    by_key = {s["device"]: s for s in summaries}
+    for dev, reason in offline:
+        by_key[device_key(dev)] = offline_summary(dev, reason)
+    summaries = [by_key[device_key(dev)] for dev in all_devices if device_key(dev) in by_key]
+
+    for s in summaries:
+        s["sent"] = drainer.sent.get(s["sn"], 0)
+        metrics.set_device(s["device"], sent=s["sent"])
+        s["phases"] = metrics.devices.get(s["device"], {}).get("phases", {})
+    update_watermarks(outbox, drainer.touched, log)
+    outbox.prune()
 
+    metrics.finish()
+    log_summary(summaries, time.monotonic() - started, log)
+    log(http.describe())
+    export_metrics(metrics, options, log)
     log("🎉 Sync complete!")
+    return summaries
+
+
+def offline_summary(dev, reason):
+    return {"ip": dev.get("ip"), "device": device_key(dev), "sn": dev.get("sn"), "fetched": 0, "skipped": 0,
+            "bytes": 0, "queued": 0, "sent": 0, "locked": 0.0, "ok": False, "error": reason, "elapsed": 0.0}
+
+
+def export_metrics(metrics, options, log):
+    json_path, prom_path = export_paths(options)
+    u = metrics.upload
+    if u["requests"]:
+        log(f"📊 {u['requests']} upload request(s), avg {u['latency_sum'] / u['requests'] * 1000:.0f} ms, "
+            f"{u['throttled']} throttled (429)")
+    try:
+        metrics.export(json_path, prom_path)
+    except OSError as e:
+        log(f"⚠️ Could not write metrics: {e}")
+
+
+def update_watermarks(outbox, sns, log):
+    """Advance SyncDUP to each device's contiguous confirmed prefix in the outbox."""
+    for sn in sns:
+        wm = outbox.confirmed_watermark(sn)
+        if not wm:
+            continue
+        wm = datetime.strptime(wm, TS_FORMAT)
+        current = dup.get_last_sync(sn)
+        if current is None or wm > current:
+            dup.save_last_sync(sn, wm)
+            log(f"💾 Last sync updated for {sn} → {wm}")
+
+
+def log_summary(summaries, elapsed, log):
+    log("📋 Per-device summary:")
+    for s in summaries:
+        name = f"{s['device']} ({s['sn'] or 'SN ?'})"
+        if s["ok"]:
+            log(f"   ✔ {name}: fetched {s['fetched']}, skipped {s['skipped']}, queued {s['queued']}, "
+                f"sent {s['sent']} in {s['elapsed']:.1f}s, locked {s['locked']:.1f}s{phase_text(s.get('phases'))}")
+        else:
+            log(f"   ❌ {name}: {s['error']} ({s['elapsed']:.1f}s)")
+    fetched = sum(s["fetched"] for s in summaries)
+    skipped = sum(s["skipped"] for s in summaries)
+    kb = sum(s["bytes"] for s in summaries) // 1024
+    log(f"📦 Transferred {fetched} log(s) (~{kb} KB), skipped {skipped} already-seen log(s)")
+    slowest = max((s["elapsed"] for s in summaries), default=0.0)
+    locked = max((s["locked"] for s in summaries), default=0.0)
+    log(f"⏱ Cycle took {elapsed:.1f}s (slowest device {slowest:.1f}s, longest lock {locked:.1f}s)")
+
+
+def phase_text(phases):
+    # 🐢 সবচেয়ে ধীর দুটো phase, কোন ধাপে সময় যাচ্ছে বোঝার জন্য
+    if not phases:
+        return ""
+    slow = sorted(phases.items(), key=lambda kv: kv[1], reverse=True)[:2]
+    return " (" + ", ".join(f"{name} {sec:.1f}s" for name, sec in slow) + ")"